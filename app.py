@@ -1,10 +1,17 @@
+# Only light modules are imported here: TensorFlow loads with the model on the
+# Detector page (backends.py) and plotly on the Statistics page
+import io
+import os
+import time
 import streamlit as st
-import tensorflow as tf
-import numpy as np
 from PIL import Image
-from tensorflow.keras.applications.resnet50 import preprocess_input
-import plotly.graph_objects as go
-import plotly.express as px
+
+import gradcam
+import inference
+import inference_client
+import metrics
+from batcher import DynamicBatcher
+from prediction_cache import CACHE_PATH, PredictionCache, model_version
 
 # ============================================================
 # PAGE CONFIG
@@ -422,41 +429,191 @@ st.markdown("""
 # CONFIGURATION
 # ============================================================
 
-IMAGE_SIZE = 224
-MODEL_PATH = "chest_xray_model_fixed.keras"
+IMAGE_SIZE = inference.IMAGE_SIZE
+# Serving runtime: "keras" (default), "savedmodel", "onnx" or "tflite"; point
+# PNEUMODETECT_MODEL_PATH at the matching export_model.py output for non-Keras runtimes
+MODEL_BACKEND = os.environ.get("PNEUMODETECT_BACKEND", "keras")
+MODEL_PATH = os.environ.get("PNEUMODETECT_MODEL_PATH", inference.MODEL_PATH)
+# Compute precision for the keras backend: "float32" (default) or "bfloat16"
+MODEL_PRECISION = os.environ.get("PNEUMODETECT_PRECISION", "float32")
+# Optional: score through a running server.py instead of loading the model in-process
+INFERENCE_URL = os.environ.get("PNEUMODETECT_INFERENCE_URL")
+# SQLite file backing the prediction cache ("" keeps it in memory only)
+CACHE_PATH = os.environ.get("PNEUMODETECT_CACHE_PATH", CACHE_PATH)
+# Longest side of the preview sent to the browser, and how many decoded uploads to keep
+THUMBNAIL_SIZE = 1024
+UPLOAD_CACHE_ENTRIES = 32
+# Opt-in: load and warm the model in the background from the first page view ("1").
+# Off by default so Home and the other pages never pay for importing TensorFlow.
+PRELOAD_MODEL = os.environ.get("PNEUMODETECT_PRELOAD", "0") == "1"
+# Prometheus metrics: a side HTTP port serving /metrics and/or a textfile
+# rewritten after every analysis (for node_exporter's textfile collector)
+METRICS_PORT = os.environ.get("PNEUMODETECT_METRICS_PORT")
+METRICS_FILE = os.environ.get("PNEUMODETECT_METRICS_FILE")
+# Grad-CAM needs gradients, so heatmaps are only offered for the in-process keras model
+HEATMAPS_AVAILABLE = MODEL_BACKEND == "keras" and not INFERENCE_URL
+
+# ============================================================
+# METRICS
+# ============================================================
+
+@st.cache_resource
+def start_metrics_server(port):
+    """Serve /metrics on a side port, once per process"""
+    return metrics.start_http_server(port)
+
+def publish_metrics():
+    """Refresh the metrics textfile, if one is configured"""
+    if METRICS_FILE:
+        metrics.write_textfile(METRICS_FILE)
+
+if METRICS_PORT:
+    start_metrics_server(int(METRICS_PORT))
 
 # ============================================================
 # LOAD MODEL
 # ============================================================
 
+def warm_model():
+    """Load and warm up the model; returns (model, version of the file it was loaded from)"""
+    version = model_version(MODEL_PATH)
+    return inference.load_model(MODEL_PATH, MODEL_BACKEND, MODEL_PRECISION), version
+
 @st.cache_resource
+def get_model_loader():
+    """Process-wide background load, started by the first script run on any page"""
+    return inference.BackgroundLoader(warm_model)
+
 def load_model():
-    """Load the trained pneumonia detection model"""
-    try:
-        model = tf.keras.models.load_model(MODEL_PATH, compile=False)
-        return model
-    except Exception as e:
-        st.error(f"Error loading model: {e}")
+    """Load the trained pneumonia detection model (waits for the background load)"""
+    loader = get_model_loader()
+    loaded = loader.wait()
+    if loader.error is not None:
+        metrics.ERRORS.labels(endpoint="app", kind="model_load").inc()
+        st.error(f"Error loading model: {loader.error}")
         return None
+    return loaded[0]
+
+@st.cache_resource
+def get_batcher(_model):
+    """Process-wide batcher so concurrent sessions share forward passes"""
+    return DynamicBatcher(lambda batch: inference.predict_batch(_model, batch))
+
+@st.cache_resource
+def get_explainer(_model):
+    """Process-wide Grad-CAM batcher returning (probability, heatmap) from one pass"""
+    explainer = gradcam.GradCAM(_model)
+    explainer.warmup()
+    return DynamicBatcher(
+        lambda batch: list(zip(*explainer.explain_batch(batch))),
+        to_result=lambda row: (float(row[0]), row[1]),
+    )
+
+@st.cache_resource
+def get_prediction_cache():
+    """Content-hash prediction cache shared by all sessions, keyed on the loaded model's file"""
+    _, version = get_model_loader().wait()
+    return PredictionCache(MODEL_PATH, CACHE_PATH, backend=MODEL_BACKEND, precision=MODEL_PRECISION,
+                           version=version)
 
 # ============================================================
 # PREPROCESS IMAGE
 # ============================================================
 
-def preprocess_image(image):
-    """Convert and prepare image for model prediction"""
+@st.cache_data(max_entries=UPLOAD_CACHE_ENTRIES, show_spinner=False)
+def decode_upload(content):
+    """Image details, a display thumbnail and the model input for one upload
+
+    Cached on the upload's bytes: Streamlit reruns the whole script on every
+    widget interaction, and without this each rerun decoded the full-size
+    X-ray again and re-encoded it as a full-size PNG for the browser. The
+    thumbnail is decoded at reduced scale where the format allows it.
+    """
     try:
-        image = image.convert("L")  # Grayscale
-        image = image.resize((IMAGE_SIZE, IMAGE_SIZE))
-        image_array = np.array(image)
-        # Convert grayscale to RGB
-        image_array = np.stack((image_array,) * 3, axis=-1)
-        # ResNet50 preprocessing
-        image_array = preprocess_input(image_array)
-        return np.expand_dims(image_array, axis=0)
+        image = Image.open(io.BytesIO(content))
+        details = {"width": image.size[0], "height": image.size[1], "format": image.format}
+        with metrics.STAGE_SECONDS.labels(stage="thumbnail").time():
+            image.draft(None, (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+            image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), reducing_gap=inference.REDUCING_GAP)
+            if image.mode not in ("L", "RGB"):
+                image = image.convert("RGB")
+            thumbnail = io.BytesIO()
+            image.save(thumbnail, format="JPEG", quality=90)
     except Exception as e:
-        st.error(f"Image preprocessing error: {e}")
-        return None
+        return {"error": str(e)}
+    # Same decode and preprocessing as batch analysis and the server
+    array, error = inference.decode_image(content)
+    return {**details, "thumbnail": thumbnail.getvalue(), "array": array, "error": error}
+
+# ============================================================
+# BATCH ANALYSIS
+# ============================================================
+
+def predict_uploads(model, uploaded_files, on_progress=None):
+    """Score uploads locally or through the inference server; one (probability, error) per file"""
+    if INFERENCE_URL:
+        return inference_client.predict_files(
+            INFERENCE_URL, [(f.name, f.getvalue()) for f in uploaded_files]
+        )
+    return inference.predict_sources(
+        model, uploaded_files, on_progress=on_progress, cache=get_prediction_cache()
+    )
+
+def render_batch_analysis(model):
+    """Multi-file upload, batched inference and a sortable results table"""
+    uploaded_files = st.file_uploader(
+        "📁 Upload Chest X-ray Images",
+        type=["jpg", "jpeg", "png"],
+        accept_multiple_files=True,
+        help="Select one or more chest X-ray images for batch analysis"
+    )
+    
+    if not uploaded_files:
+        return
+    
+    st.info(f"**{len(uploaded_files)}** image(s) selected")
+    
+    if not st.button("🔍 Analyze All", use_container_width=True, type="primary"):
+        return
+    
+    metrics.REQUESTS.labels(endpoint="batch").inc()
+    start = time.perf_counter()
+    progress = st.progress(0.0, text=f"🤖 Analyzing {len(uploaded_files)} image(s)...")
+    results = predict_uploads(model, uploaded_files, on_progress=progress.progress)
+    progress.empty()
+    metrics.ERRORS.labels(endpoint="batch", kind="decode").inc(sum(1 for prob, _ in results if prob is None))
+    
+    rows = []
+    for uploaded_file, (prob, error) in zip(uploaded_files, results):
+        if prob is None:
+            rows.append({
+                "Filename": uploaded_file.name,
+                "Result": f"Error: {error}",
+                "Pneumonia Probability": None,
+                "Confidence (%)": None,
+            })
+            continue
+        confidence = prob if prob > 0.5 else (1 - prob)
+        rows.append({
+            "Filename": uploaded_file.name,
+            "Result": "PNEUMONIA" if prob > 0.5 else "NORMAL",
+            "Pneumonia Probability": round(prob, 4),
+            "Confidence (%)": round(confidence * 100, 1),
+        })
+    
+    positives = sum(1 for row in rows if row["Result"] == "PNEUMONIA")
+    failed = sum(1 for prob, _ in results if prob is None)
+    
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Analyzed", len(results) - failed)
+    col2.metric("Pneumonia Detected", positives)
+    col3.metric("Failed", failed)
+    
+    st.markdown("### 📋 Results")
+    st.caption("Click a column header to sort.")
+    st.dataframe(rows, use_container_width=True, hide_index=True)
+    metrics.REQUEST_SECONDS.labels(endpoint="batch").observe(time.perf_counter() - start)
+    publish_metrics()
 
 # ============================================================
 # MAIN APP HEADER
@@ -477,6 +634,15 @@ with st.sidebar:
     st.markdown("## 📋 Navigation")
     page = st.radio("Select a page:", 
         ["🏠 Home", "📊 Statistics", "📖 About Pneumonia", "🔬 Detector"])
+    
+    if PRELOAD_MODEL and not INFERENCE_URL:
+        # Start loading the model while the user is still on other pages
+        model_state = get_model_loader().state
+        st.caption({
+            "loading": "⏳ Model warming up...",
+            "ready": "🟢 Model ready",
+            "failed": "🔴 Model failed to load",
+        }[model_state])
 
 # ============================================================
 # PAGE 1: HOME
@@ -565,6 +731,9 @@ elif page == "📊 Statistics":
         """)
     
     with col2:
+        # Imported here so the other pages never load plotly
+        import plotly.graph_objects as go
+
         # Create a chart
         causes = ["Bacterial", "Viral", "Fungal", "Atypical"]
         percentages = [50, 30, 10, 10]
@@ -748,64 +917,132 @@ elif page == "🔬 Detector":
     </div>
     """, unsafe_allow_html=True)
     
-    # Load model
-    with st.spinner("Loading AI model..."):
-        model = load_model()
-    
-    if model is None:
-        st.error("❌ Failed to load the model. Please check the model file.")
-        st.stop()
-    
-    st.success("✅ Model loaded successfully!")
+    if INFERENCE_URL:
+        model = None
+        if not inference_client.is_healthy(INFERENCE_URL):
+            st.error(f"❌ Inference server at {INFERENCE_URL} is not reachable.")
+            st.stop()
+        
+        st.success(f"✅ Connected to inference server at {INFERENCE_URL}")
+    else:
+        # Load model
+        with st.spinner("Loading AI model..."):
+            model = load_model()
+        
+        if model is None:
+            st.error("❌ Failed to load the model. Please check the model file.")
+            st.stop()
+        
+        st.success("✅ Model loaded successfully!")
+        
+        with st.expander("⚡ Prediction cache"):
+            st.json(get_prediction_cache().stats())
     
     st.markdown("---")
     
-    # File upload
-    col1, col2 = st.columns([2, 1])
+    analysis_mode = st.radio("Analysis mode:", ["🖼️ Single image", "📚 Batch analysis"], horizontal=True)
     
-    with col1:
-        uploaded_file = st.file_uploader(
-            "📁 Upload Chest X-ray Image",
-            type=["jpg", "jpeg", "png"],
-            help="Select a chest X-ray image for analysis"
-        )
-    
-    with col2:
-        st.markdown("")  # Spacing
+    if analysis_mode == "📚 Batch analysis":
+        render_batch_analysis(model)
+        uploaded_file = None
+    else:
+        # File upload
+        col1, col2 = st.columns([2, 1])
+        
+        with col1:
+            uploaded_file = st.file_uploader(
+                "📁 Upload Chest X-ray Image",
+                type=["jpg", "jpeg", "png"],
+                help="Select a chest X-ray image for analysis"
+            )
+        
+        with col2:
+            st.markdown("")  # Spacing
     
     if uploaded_file is not None:
         # Display uploaded image
-        image = Image.open(uploaded_file)
+        content = uploaded_file.getvalue()
+        upload = decode_upload(content)
+        if "thumbnail" not in upload:
+            st.error(f"Could not read this image: {upload['error']}")
+            st.stop()
         
         col1, col2 = st.columns(2)
         
         with col1:
             st.markdown("### 🖼️ Uploaded X-ray")
-            st.image(image, use_container_width=True, output_format="PNG")
+            st.image(upload["thumbnail"], use_container_width=True)
         
         with col2:
             st.markdown("### 📋 Image Information")
             st.info(f"""
             - **Filename:** {uploaded_file.name}
-            - **Size:** {image.size[0]} × {image.size[1]} pixels
-            - **Format:** {image.format}
+            - **Size:** {upload["width"]} × {upload["height"]} pixels
+            - **Format:** {upload["format"]}
             """)
         
         st.markdown("---")
         
+        show_heatmap = HEATMAPS_AVAILABLE and st.checkbox(
+            "🔥 Show heatmap",
+            help="Grad-CAM overlay of the regions that drove the prediction",
+        )
+        
         # Prediction button
         if st.button("🔍 Analyze X-ray", use_container_width=True, type="primary"):
+            metrics.REQUESTS.labels(endpoint="detector").inc()
+            request_start = time.perf_counter()
             with st.spinner("🤖 Analyzing image with AI model..."):
                 # Preprocess and predict
-                processed_img = preprocess_image(image)
+                if INFERENCE_URL:
+                    with metrics.STAGE_SECONDS.labels(stage="predict").time():
+                        prob, error = predict_uploads(model, [uploaded_file])[0]
+                    if error is not None:
+                        st.error(f"Image preprocessing error: {error}")
+                else:
+                    cache = get_prediction_cache()
+                    prob = cache.get(content)
+                    if show_heatmap:
+                        stored = cache.get_heatmap(content)
+                        heatmap = None if stored is None else gradcam.heatmap_from_bytes(stored)
+                    if prob is None or (show_heatmap and heatmap is None):
+                        if upload["array"] is None:
+                            st.error(f"Image preprocessing error: {upload['error']}")
+                        elif show_heatmap:
+                            # The same forward pass yields the probability and the heatmap
+                            with metrics.STAGE_SECONDS.labels(stage="explain").time():
+                                prob, heatmap = get_explainer(model).predict(upload["array"])
+                            cache.put(content, prob, gradcam.heatmap_to_bytes(heatmap))
+                        else:
+                            # Includes the batcher's queueing delay on top of the forward pass
+                            with metrics.STAGE_SECONDS.labels(stage="predict").time():
+                                prob = get_batcher(model).predict(upload["array"])
+                            cache.put(content, prob)
                 
-                if processed_img is not None:
-                    prediction = model.predict(processed_img, verbose=0)
-                    prob = float(prediction[0][0])
+                if prob is None:
+                    metrics.ERRORS.labels(endpoint="detector", kind="preprocess").inc()
+                render_start = time.perf_counter()
+                if prob is not None:
                     confidence = prob if prob > 0.5 else (1 - prob)
                     
                     st.markdown("---")
                     
+                    if show_heatmap and heatmap is not None:
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            st.markdown("### 🔥 Model Attention")
+                            thumbnail = Image.open(io.BytesIO(upload["thumbnail"]))
+                            st.image(gradcam.overlay(thumbnail, heatmap), use_container_width=True)
+                        with col2:
+                            st.markdown("### 🧭 Reading the Heatmap")
+                            st.info("""
+                            - **Red/yellow** regions contributed most to the prediction
+                            - **Uncoloured** regions had little influence
+                            - The map is coarse (7 × 7 cells upsampled), so treat it as a guide to where the model looked, not a lesion outline
+                            """)
+                        
+                        st.markdown("---")
+                    
                     # Display result
                     if prob > 0.5:
                         # PNEUMONIA DETECTED
@@ -903,6 +1140,11 @@ elif page == "🔬 Detector":
                         **Note:** Even with a normal result, if you have persistent respiratory 
                         symptoms, consult your healthcare provider for further evaluation.
                         """)
+                
+                now = time.perf_counter()
+                metrics.STAGE_SECONDS.labels(stage="render").observe(now - render_start)
+                metrics.REQUEST_SECONDS.labels(endpoint="detector").observe(now - request_start)
+                publish_metrics()
 
 # ============================================================
 # FOOTER
@@ -0,0 +1,256 @@
+"""Pluggable inference runtimes behind one load / predict_batch / warmup interface
+
+Every backend takes the uint8 ``(N, 224, 224, 1)`` grayscale batches produced
+by ``inference.prepare_image_array`` and returns ``N`` pneumonia
+probabilities. Models that expect the original preprocessed RGB input get it
+from ``inference.to_resnet_input``; single-channel models exported with
+``export_model.py grayscale`` receive the grayscale batch as is.
+
+Runtime libraries are imported inside ``load()``, so the ONNX Runtime and
+TFLite (with ``tflite_runtime`` installed) backends never import TensorFlow.
+
+    keras      .keras file, called through a tf.function traced once
+    savedmodel directory written by ``export_model.py savedmodel``
+    onnx       .onnx file written by ``export_model.py onnx``, CPU provider
+    tflite     .tflite file written by ``export_model.py tflite``
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from inference import BATCH_SIZE, IMAGE_SIZE, to_resnet_input
+
+class InferenceBackend:
+    """Base class: subclasses implement load() and _run()
+
+    ``load()`` must set ``input_channels`` (1 or 3) and ``input_dtype`` from
+    the loaded model's input.
+    """
+
+    input_channels = 3
+    input_dtype = np.float32
+    precisions = ("float32",)  # Compute precisions the backend can serve in
+
+    def __init__(self, model_path, precision="float32"):
+        if precision not in self.precisions:
+            raise ValueError(
+                f"{type(self).__name__} does not support precision {precision!r}; "
+                f"expected one of {self.precisions}"
+            )
+        self.model_path = model_path
+        self.precision = precision
+        self.load()
+
+    def load(self):
+        """Load the model file into the runtime"""
+        raise NotImplementedError
+
+    def _run(self, model_input):
+        """Probabilities for a batch already in the model's input format"""
+        raise NotImplementedError
+
+    def predict_batch(self, batch):
+        """Pneumonia probabilities for one stacked grayscale batch"""
+        if self.input_channels == 1:
+            return self._run(np.asarray(batch, dtype=self.input_dtype))
+        return self._run(to_resnet_input(batch))
+
+    def warmup(self, batch_sizes=(1, BATCH_SIZE)):
+        """Run each batch shape the app uses once so the first request is not slow"""
+        for batch_size in batch_sizes:
+            self.predict_batch(np.zeros((batch_size, IMAGE_SIZE, IMAGE_SIZE, 1), dtype=np.uint8))
+
+# ============================================================
+# TENSORFLOW BACKENDS
+# ============================================================
+
+class KerasBackend(InferenceBackend):
+    """Keras model behind a tf.function traced once for a fixed (None, 224, 224, C) input
+
+    Calling the traced function skips the data adapter and callback loop that
+    ``model.predict`` builds on every call, which dominates latency for the
+    one-image batches the Detector sends.
+
+    With ``precision="bfloat16"`` the model is rebuilt under the
+    ``mixed_bfloat16`` policy (bf16 compute, float32 weights) with the
+    sigmoid output layer kept in float32. Models trained with
+    ``--mixed-precision mixed_bfloat16`` already carry that policy and
+    serve in bf16 either way.
+    """
+
+    precisions = ("float32", "bfloat16")
+
+    def load(self):
+        import tensorflow as tf
+        import model_layers  # noqa: F401  Registers the in-graph preprocessing layers
+
+        self.tf = tf
+        self.model = tf.keras.models.load_model(self.model_path, compile=False)
+        if self.precision == "bfloat16":
+            self.model = self._to_mixed_bfloat16(self.model)
+        model_input = self.model.inputs[0]
+        self.input_channels = model_input.shape[-1]
+        self.input_dtype = tf.as_dtype(model_input.dtype).as_numpy_dtype
+        self._infer = tf.function(
+            self._forward,
+            input_signature=[tf.TensorSpec(
+                (None, IMAGE_SIZE, IMAGE_SIZE, self.input_channels), model_input.dtype
+            )],
+        )
+
+    def _to_mixed_bfloat16(self, model):
+        """Clone model with every layer but the inputs and the output on mixed_bfloat16"""
+        keep = {model.layers[-1].name}
+
+        def set_policy(node):
+            if isinstance(node, dict):
+                config = node.get("config")
+                if (isinstance(config, dict) and "dtype" in config
+                        and node.get("class_name") != "InputLayer"
+                        and config.get("name") not in keep):
+                    config["dtype"] = "mixed_bfloat16"
+                for value in node.values():
+                    set_policy(value)
+            elif isinstance(node, list):
+                for value in node:
+                    set_policy(value)
+
+        config = model.get_config()
+        set_policy(config)
+        clone = model.__class__.from_config(config)
+        clone.set_weights(model.get_weights())
+        return clone
+
+    def _forward(self, batch):
+        return self.tf.cast(self.model(batch, training=False)[:, 0], self.tf.float32)
+
+    def _run(self, model_input):
+        return self._infer(self.tf.convert_to_tensor(model_input)).numpy()
+
+class SavedModelBackend(InferenceBackend):
+    """SavedModel directory served through its serving_default signature"""
+
+    def load(self):
+        import tensorflow as tf
+
+        self.tf = tf
+        self.module = tf.saved_model.load(self.model_path)
+        self._infer = self.module.signatures["serving_default"]
+        spec = next(iter(self._infer.structured_input_signature[1].values()))
+        self.input_channels = spec.shape[-1]
+        self.input_dtype = spec.dtype.as_numpy_dtype
+
+    def _run(self, model_input):
+        outputs = self._infer(self.tf.convert_to_tensor(model_input))
+        return next(iter(outputs.values())).numpy().reshape(len(model_input), -1)[:, 0]
+
+# ============================================================
+# TENSORFLOW-FREE BACKENDS
+# ============================================================
+
+class OnnxBackend(InferenceBackend):
+    """ONNX export run with onnxruntime's CPU execution provider"""
+
+    def load(self):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The onnx backend needs `pip install onnxruntime`") from e
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = os.cpu_count() or 1
+        self.session = ort.InferenceSession(
+            self.model_path, options, providers=["CPUExecutionProvider"]
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.input_channels = model_input.shape[-1]
+        self.input_dtype = np.uint8 if model_input.type == "tensor(uint8)" else np.float32
+
+    def _run(self, model_input):
+        model_input = np.ascontiguousarray(model_input)
+        outputs = self.session.run(None, {self.input_name: model_input})
+        return outputs[0].reshape(len(model_input), -1)[:, 0]
+
+class TFLiteBackend(InferenceBackend):
+    """TensorFlow Lite interpreter; uses tflite_runtime when installed, else tf.lite
+
+    Handles float, dynamic-range and full-int8 models; for int8 models a
+    float input is quantized and the output dequantized with the tensor's
+    scale and zero point.
+
+    Resizing an interpreter's input reallocates its tensors, so there is one
+    interpreter per size in ``batch_sizes``, allocated at load. A batch is
+    zero-padded up to the next of those sizes (larger ones run in chunks of
+    the largest); the dynamic batcher's 1-16 image batches never resize.
+    """
+
+    batch_sizes = (1, BATCH_SIZE)
+
+    def load(self):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+
+            Interpreter = tf.lite.Interpreter
+        self._interpreters = {}
+        for batch_size in self.batch_sizes:
+            interpreter = Interpreter(model_path=self.model_path, num_threads=os.cpu_count())
+            model_input = interpreter.get_input_details()[0]
+            interpreter.resize_tensor_input(
+                model_input["index"], (batch_size, IMAGE_SIZE, IMAGE_SIZE, model_input["shape"][-1])
+            )
+            interpreter.allocate_tensors()
+            self._interpreters[batch_size] = (
+                interpreter, interpreter.get_input_details()[0], interpreter.get_output_details()[0]
+            )
+        _, self.input, self.output = self._interpreters[self.batch_sizes[0]]
+        self.input_channels = int(self.input["shape"][-1])
+        self.input_dtype = np.uint8 if self.input["dtype"] == np.uint8 else np.float32
+        self._lock = threading.Lock()  # Interpreters are not thread-safe
+
+    def _run(self, model_input):
+        count = len(model_input)
+        batch_size = next((size for size in self.batch_sizes if size >= count), None)
+        if batch_size is None:
+            largest = self.batch_sizes[-1]
+            return np.concatenate([
+                self._run(model_input[start:start + largest]) for start in range(0, count, largest)
+            ])
+        if batch_size > count:
+            padded = np.zeros((batch_size,) + model_input.shape[1:], dtype=model_input.dtype)
+            padded[:count] = model_input
+            model_input = padded
+        interpreter, input_details, output_details = self._interpreters[batch_size]
+        with self._lock:
+            dtype = input_details["dtype"]
+            if dtype != model_input.dtype:
+                scale, zero_point = input_details["quantization"]
+                info = np.iinfo(dtype)
+                model_input = np.clip(
+                    np.round(model_input / scale + zero_point), info.min, info.max
+                ).astype(dtype)
+            interpreter.set_tensor(input_details["index"], model_input)
+            interpreter.invoke()
+            output = interpreter.get_tensor(output_details["index"])
+            if output_details["dtype"] != np.float32:
+                scale, zero_point = output_details["quantization"]
+                output = (output.astype(np.float32) - zero_point) * scale
+        return output.reshape(batch_size, -1)[:count, 0]
+
+BACKENDS = {
+    "keras": KerasBackend,
+    "savedmodel": SavedModelBackend,
+    "onnx": OnnxBackend,
+    "tflite": TFLiteBackend,
+}
+
+def load_backend(model_path, backend="keras", precision="float32"):
+    """Instantiate the named backend for model_path (not yet warmed up)"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}; expected one of {sorted(BACKENDS)}")
+    return BACKENDS[backend](model_path, precision)
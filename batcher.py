@@ -0,0 +1,92 @@
+"""Process-wide dynamic request batcher in front of a shared model
+
+Concurrent callers (Streamlit sessions, server threads) submit single images.
+A background thread collects them into one batch, up to ``max_batch_size``
+items or ``max_wait_ms`` after the first item arrived, runs one forward pass
+and hands each caller its own result.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+MAX_BATCH_SIZE = 16
+MAX_WAIT_MS = 10
+
+_STOP = object()
+
+class DynamicBatcher:
+    """Coalesces single-image predictions from many threads into batched calls
+
+    ``predict_fn`` takes a stacked ``(N, ...)`` array and returns ``N``
+    probabilities. It is only ever called from the batcher's worker thread.
+    ``to_result`` turns one of those rows into the caller's result.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                 to_result=float):
+        self.predict_fn = predict_fn
+        self.to_result = to_result
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="dynamic-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, array):
+        """Queue one preprocessed image; returns a Future resolving to its probability"""
+        future = Future()
+        self._queue.put((array, future))
+        return future
+
+    def predict(self, array, timeout=None):
+        """Blocking single-image prediction through the shared batch queue"""
+        return self.submit(array).result(timeout)
+
+    def predict_many(self, arrays, timeout=None):
+        """Queue several images at once and wait for all of them"""
+        futures = [self.submit(array) for array in arrays]
+        return [future.result(timeout) for future in futures]
+
+    def close(self):
+        """Stop the worker after it drains what is already queued"""
+        self._queue.put(_STOP)
+        self._worker.join()
+
+    def _collect(self, first):
+        """Gather up to max_batch_size requests, waiting at most max_wait after the first"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)  # Finish this batch, then stop
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+            batch = self._collect(first)
+            live = [(array, future) for array, future in batch if future.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            arrays, futures = zip(*live)
+            try:
+                probs = self.predict_fn(np.stack(arrays))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, prob in zip(futures, probs):
+                future.set_result(self.to_result(prob))
@@ -0,0 +1,99 @@
+"""Cold start of the Streamlit app: process start to first Home render
+
+Run from the repository root (needs streamlit installed):
+
+    python -m benchmarks.app_startup --runs 5 --output startup.json
+
+Each run is a fresh Python process that renders app.py once with
+Streamlit's AppTest harness (Home page), reruns it, then switches to the
+Statistics page. ``eager`` runs import TensorFlow and plotly up front, as
+the app used to at the top of the script; ``lazy`` runs the app as is.
+The child reports which heavy modules ended up loaded and its peak RSS.
+Runs use the app's shipped default, with background model preloading off.
+Pass ``--preload`` to measure ``PNEUMODETECT_PRELOAD=1`` instead.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+CHILD = r"""
+import json, resource, sys, time
+start = time.perf_counter()
+if {eager}:
+    import tensorflow
+    import plotly.graph_objects, plotly.express
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("app.py", default_timeout=300)
+app.run()
+home_s = time.perf_counter() - start
+rerun_start = time.perf_counter()
+app.run()
+rerun_s = time.perf_counter() - rerun_start
+loaded_on_home = [m for m in ("tensorflow", "plotly") if m in sys.modules]
+stats_start = time.perf_counter()
+app.sidebar.radio[0].set_value("📊 Statistics").run()
+statistics_s = time.perf_counter() - stats_start
+print(json.dumps({{
+    "home_s": home_s,
+    "rerun_s": rerun_s,
+    "statistics_s": statistics_s,
+    "loaded_on_home": loaded_on_home,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "exceptions": [str(e.value) for e in app.exception],
+}}))
+"""
+
+def run_once(eager, preload=False):
+    """(wall seconds from process start, child report) for one cold start"""
+    env = dict(os.environ)
+    env.pop("PNEUMODETECT_PRELOAD", None)  # Measure the shipped default unless asked
+    if preload:
+        env["PNEUMODETECT_PRELOAD"] = "1"
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD.format(eager=eager)], capture_output=True, text=True, check=True,
+        env=env,
+    )
+    wall_s = time.perf_counter() - start
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return wall_s, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modes", nargs="+", choices=["lazy", "eager"], default=["eager", "lazy"])
+    parser.add_argument("--preload", action="store_true", help="Run with PNEUMODETECT_PRELOAD=1")
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    results = {}
+    for mode in args.modes:
+        runs = [run_once(mode == "eager", args.preload) for _ in range(args.runs)]
+        reports = [report for _, report in runs]
+        results[mode] = {
+            "process_to_home_s": float(np.median([wall for wall, _ in runs])),
+            "home_render_s": float(np.median([r["home_s"] for r in reports])),
+            "home_rerun_s": float(np.median([r["rerun_s"] for r in reports])),
+            "statistics_first_render_s": float(np.median([r["statistics_s"] for r in reports])),
+            "max_rss_mb": float(np.median([r["max_rss_mb"] for r in reports])),
+            "loaded_on_home": reports[0]["loaded_on_home"],
+            "exceptions": reports[0]["exceptions"],
+        }
+
+    print(f"{'mode':<8}{'to Home s':>11}{'rerun s':>10}{'Stats s':>10}{'RSS MB':>9}  loaded on Home")
+    for mode, r in results.items():
+        print(f"{mode:<8}{r['process_to_home_s']:>11.2f}{r['home_rerun_s']:>10.3f}"
+              f"{r['statistics_first_render_s']:>10.2f}{r['max_rss_mb']:>9.0f}  {', '.join(r['loaded_on_home']) or '-'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
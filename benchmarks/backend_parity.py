@@ -0,0 +1,90 @@
+"""Accuracy and latency parity of exported models against the float Keras model
+
+Run from the repository root on the test split:
+
+    python -m benchmarks.backend_parity --test-dir chest_xray/test \\
+        --candidate tflite:chest_xray_model_dynamic.tflite \\
+        --candidate tflite:chest_xray_model_int8.tflite --output parity.json
+
+Every candidate is scored on the same preprocessed images as the reference
+``keras:chest_xray_model_fixed.keras``. The report lists test accuracy,
+label agreement with the reference, probability drift and latency.
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+import inference
+
+def load_split(test_dir, limit=None):
+    """Preprocessed test images and labels"""
+    items = inference.list_images(test_dir)[:limit]
+    decoded = inference.decode_images([path for path, _ in items])
+    keep = [i for i, (array, _) in enumerate(decoded) if array is not None]
+    arrays = np.stack([decoded[i][0] for i in keep])
+    labels = np.array([items[i][1] for i in keep])
+    return arrays, labels
+
+def latency_ms(model, arrays, batch_size, iterations):
+    """Median wall time of one predict_batch call at the given batch size"""
+    batch = arrays[:batch_size]
+    model.predict_batch(batch)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        model.predict_batch(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+def evaluate(model, arrays, labels, batch_size, iterations):
+    probs = np.array(inference.predict_in_batches(model, list(arrays), batch_size))
+    return probs, {
+        "accuracy": float(np.mean((probs > 0.5) == labels)),
+        "latency_batch1_ms": latency_ms(model, arrays, 1, iterations),
+        f"latency_batch{batch_size}_ms": latency_ms(model, arrays, batch_size, iterations),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--test-dir", required=True)
+    parser.add_argument("--reference", default=f"keras:{inference.MODEL_PATH}",
+                        help="backend:path of the float reference model")
+    parser.add_argument("--candidate", action="append", required=True,
+                        help="backend:path of a model to compare (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=inference.BATCH_SIZE)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--limit", type=int, help="Only use the first N test images")
+    parser.add_argument("--output", help="Optional JSON file for the report")
+    args = parser.parse_args()
+
+    arrays, labels = load_split(args.test_dir, args.limit)
+    print(f"Scoring {len(labels)} test images")
+
+    report = {}
+    reference_probs = None
+    for spec in [args.reference] + args.candidate:
+        backend, path = spec.split(":", 1)
+        model = inference.load_model(path, backend)
+        probs, metrics = evaluate(model, arrays, labels, args.batch_size, args.iterations)
+        if reference_probs is None:
+            reference_probs = probs
+        metrics["label_agreement"] = float(np.mean((probs > 0.5) == (reference_probs > 0.5)))
+        metrics["max_abs_prob_diff"] = float(np.max(np.abs(probs - reference_probs)))
+        metrics["mean_abs_prob_diff"] = float(np.mean(np.abs(probs - reference_probs)))
+        report[spec] = metrics
+
+    batch_key = f"latency_batch{args.batch_size}_ms"
+    print(f"{'model':<48}{'acc':>8}{'agree':>8}{'max|dp|':>10}{'b1 ms':>10}{batch_key[8:]:>14}")
+    for spec, m in report.items():
+        print(f"{spec:<48}{m['accuracy']:>8.4f}{m['label_agreement']:>8.4f}"
+              f"{m['max_abs_prob_diff']:>10.4f}{m['latency_batch1_ms']:>10.2f}{m[batch_key]:>14.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
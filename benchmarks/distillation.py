@@ -0,0 +1,96 @@
+"""Latency/accuracy table of distilled students against their teacher
+
+Run from the repository root on the test split:
+
+    python -m benchmarks.distillation --test-dir chest_xray/test \\
+        --student chest_xray_model_mobilenet_v3_small.keras \\
+        --student chest_xray_model_efficientnet_b0.keras --output distillation.json
+
+Every model is loaded through the keras backend, as app.py would serve it,
+and scored on the same preprocessed images as the teacher. The table lists
+parameters, forward-pass GFLOPs per image, file size, test accuracy, label
+agreement with the teacher and CPU latency at batch 1 and ``--batch-size``.
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+import inference
+from benchmarks.backend_parity import evaluate, load_split
+
+def count_flops(model):
+    """Floating-point operations of one forward pass on a single image"""
+    import tensorflow as tf
+    from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+
+    spec = tf.TensorSpec((1, *model.inputs[0].shape[1:]), model.inputs[0].dtype)
+    forward = tf.function(lambda x: model(x, training=False)).get_concrete_function(spec)
+    graph = convert_variables_to_constants_v2(forward).graph
+    options = (tf.compat.v1.profiler.ProfileOptionBuilder(
+        tf.compat.v1.profiler.ProfileOptionBuilder.float_operation()
+    ).with_empty_output().build())
+    profile = tf.compat.v1.profiler.profile(
+        graph=graph, run_meta=tf.compat.v1.RunMetadata(), cmd="op", options=options
+    )
+    return profile.total_float_ops
+
+def model_size_mb(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for root, _, names in os.walk(path) for name in names) / 2**20
+    return os.path.getsize(path) / 2**20
+
+def describe(path, arrays, labels, batch_size, iterations):
+    """(probabilities, table row) for one .keras model"""
+    model = inference.load_model(path, "keras")
+    probs, row = evaluate(model, arrays, labels, batch_size, iterations)
+    row.update({
+        "params": model.model.count_params(),
+        "gflops": count_flops(model.model) / 1e9,
+        "size_mb": model_size_mb(path),
+    })
+    return probs, row
+
+def print_table(report, batch_size):
+    batch_key = f"latency_batch{batch_size}_ms"
+    print(f"{'model':<44}{'params':>12}{'GFLOPs':>8}{'MB':>8}{'acc':>8}{'agree':>8}"
+          f"{'b1 ms':>9}{batch_key[8:]:>14}{'speedup':>9}")
+    teacher_ms = next(iter(report.values()))["latency_batch1_ms"]
+    for name, row in report.items():
+        print(f"{name:<44}{row['params']:>12,}{row['gflops']:>8.2f}{row['size_mb']:>8.1f}"
+              f"{row['accuracy']:>8.4f}{row['label_agreement']:>8.4f}{row['latency_batch1_ms']:>9.2f}"
+              f"{row[batch_key]:>14.2f}{teacher_ms / row['latency_batch1_ms']:>8.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--test-dir", required=True)
+    parser.add_argument("--teacher", default=inference.MODEL_PATH)
+    parser.add_argument("--student", action="append", required=True, help="Student .keras file (repeatable)")
+    parser.add_argument("--batch-size", type=int, default=inference.BATCH_SIZE)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--limit", type=int, help="Only use the first N test images")
+    parser.add_argument("--output", help="Optional JSON file for the report")
+    args = parser.parse_args()
+
+    arrays, labels = load_split(args.test_dir, args.limit)
+    print(f"Scoring {len(labels)} test images")
+
+    report = {}
+    teacher_probs = None
+    for path in [args.teacher] + args.student:
+        probs, row = describe(path, arrays, labels, args.batch_size, args.iterations)
+        if teacher_probs is None:
+            teacher_probs = probs
+        row["label_agreement"] = float(np.mean((probs > 0.5) == (teacher_probs > 0.5)))
+        report[path] = row
+
+    print_table(report, args.batch_size)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""Detector code path end to end: decode, preprocess and forward pass timed separately
+
+Run from the repository root:
+
+    python -m benchmarks.end_to_end --output e2e.json
+    python -m benchmarks.end_to_end --sample-dir chest_xray/test --backend onnx \\
+        --model chest_xray_model.onnx --output e2e_onnx.json
+
+Inputs are synthetic X-ray-like images at clinical sizes (1k-4k pixels) in
+JPEG and PNG, plus any files in ``--sample-dir``. For each input the stages
+the Detector runs are timed on their own:
+
+    decode      inference.open_image on the uploaded bytes
+    preprocess  prepare_image_array (grayscale, resize to 224) plus a batch axis
+    forward     the model's predict call on the (1, 224, 224, 1) batch
+
+and reported as p50/p95/p99. A sweep then measures end-to-end images/sec
+(threaded decode + batched predict, as in batch analysis) against batch
+size and decode thread count. ``--no-model`` skips everything that needs a
+model. The JSON output is meant to be diffed between releases.
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import time
+
+import numpy as np
+from PIL import Image
+
+import inference
+from benchmarks.single_image_latency import summarize, time_calls
+
+SIZES = ((1024, 1024), (2048, 2048), (2500, 3000), (4096, 4096))
+FORMATS = ("JPEG", "PNG")
+
+def synthetic_xray(width, height, seed=0):
+    """Grayscale image with smooth anatomy-like structure and film noise
+
+    Pure noise would make PNG unrealistically incompressible and JPEG
+    unrealistically slow, so the content is mostly low-frequency.
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    x /= width
+    y /= height
+    body = 200 * np.exp(-(((x - 0.5) / 0.45) ** 2 + ((y - 0.5) / 0.6) ** 2))
+    lungs = 90 * (np.exp(-(((x - 0.3) / 0.12) ** 2 + ((y - 0.45) / 0.25) ** 2))
+                  + np.exp(-(((x - 0.7) / 0.12) ** 2 + ((y - 0.45) / 0.25) ** 2)))
+    ribs = 25 * (np.sin(y * 60) > 0.6)
+    pixels = body - lungs + ribs + rng.normal(0, 6, (height, width))
+    return Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8), "L")
+
+def encode(image, image_format):
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format, **({"quality": 90} if image_format == "JPEG" else {}))
+    return buffer.getvalue()
+
+def make_inputs(sample_dir=None, sample_limit=20):
+    """[(name, encoded bytes)] for the synthetic sizes/formats and sample files"""
+    inputs = []
+    for width, height in SIZES:
+        image = synthetic_xray(width, height)
+        for image_format in FORMATS:
+            inputs.append((f"synthetic_{width}x{height}.{image_format.lower()}", encode(image, image_format)))
+    if sample_dir:
+        paths = [path for path, _ in inference.list_images(sample_dir)]
+        step = max(1, len(paths) // sample_limit)
+        for path in paths[::step][:sample_limit]:
+            with open(path, "rb") as f:
+                inputs.append((f"sample/{os.path.basename(path)}", f.read()))
+    return inputs
+
+def decode(content):
+    return inference.open_image(io.BytesIO(content))
+
+def preprocess_image(image):
+    """The Detector's preprocessing: grayscale, 224x224, batch axis"""
+    return np.expand_dims(inference.prepare_image_array(image), axis=0)
+
+def stage_timings(model, inputs, iterations):
+    """Per-input decode / preprocess / forward latency summaries"""
+    results = {}
+    for name, content in inputs:
+        image = decode(content)
+        batch = preprocess_image(image)
+        entry = {
+            "bytes": len(content),
+            "pixels": f"{image.size[0]}x{image.size[1]}",
+            "decode": summarize(time_calls(lambda: decode(content), iterations)),
+            "preprocess": summarize(time_calls(lambda: preprocess_image(image), iterations)),
+        }
+        if model is not None:
+            entry["forward"] = summarize(time_calls(lambda: model.predict_batch(batch), iterations))
+            entry["total_p50_ms"] = sum(entry[stage]["p50_ms"] for stage in ("decode", "preprocess", "forward"))
+        results[name] = entry
+    return results
+
+def throughput(model, inputs, batch_size, threads, images):
+    """End-to-end images/sec: threaded decode + preprocess, then batched predict"""
+    contents = [inputs[i % len(inputs)][1] for i in range(images)]
+    start = time.perf_counter()
+    decoded = inference.decode_images(contents, workers=threads)
+    arrays = [array for array, _ in decoded]
+    decode_s = time.perf_counter() - start
+    if model is not None:
+        inference.predict_in_batches(model, arrays, batch_size)
+    total_s = time.perf_counter() - start
+    return {"images_per_sec": images / total_s, "decode_images_per_sec": images / decode_s}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=inference.MODEL_PATH)
+    parser.add_argument("--backend", default="keras")
+    parser.add_argument("--precision", default="float32")
+    parser.add_argument("--no-model", action="store_true", help="Only time decode and preprocess")
+    parser.add_argument("--sample-dir", help="Class-per-folder tree of real X-rays, e.g. chest_xray/test")
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--sweep-images", type=int, default=64, help="Images per throughput measurement")
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    model = None if args.no_model else inference.load_model(args.model, args.backend, args.precision)
+    inputs = make_inputs(args.sample_dir)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "pillow": Image.__version__,
+            "numpy": np.__version__,
+            "backend": None if model is None else args.backend,
+            "precision": None if model is None else args.precision,
+            "model": None if model is None else args.model,
+        },
+        "stages": stage_timings(model, inputs, args.iterations),
+        "throughput": [],
+    }
+
+    print(f"{'input':<34}{'decode p50':>12}{'prep p50':>10}{'fwd p50':>10}{'p99 total':>11}  (ms)")
+    for name, entry in report["stages"].items():
+        forward = entry.get("forward", {})
+        p99 = sum(entry[stage]["p99_ms"] for stage in ("decode", "preprocess", "forward") if stage in entry)
+        print(f"{name:<34}{entry['decode']['p50_ms']:>12.1f}{entry['preprocess']['p50_ms']:>10.1f}"
+              f"{forward.get('p50_ms', float('nan')):>10.1f}{p99:>11.1f}")
+
+    batch_sizes = args.batch_sizes if model is not None else args.batch_sizes[:1]
+    print(f"\n{'batch':>6}{'threads':>9}{'img/s':>10}{'decode img/s':>14}")
+    for batch_size in batch_sizes:
+        for threads in args.threads:
+            result = throughput(model, inputs, batch_size, threads, args.sweep_images)
+            report["throughput"].append({"batch_size": batch_size, "threads": threads, **result})
+            print(f"{batch_size:>6}{threads:>9}{result['images_per_sec']:>10.1f}"
+                  f"{result['decode_images_per_sec']:>14.1f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Reduced-resolution decode vs full decode: speed, decoded size and prediction parity
+
+Run from the repository root:
+
+    python -m benchmarks.fast_decode --sample-dir chest_xray/test --output fast_decode.json
+
+Compares ``inference.open_image`` + ``prepare_image_array`` with
+``fast=False`` (full-resolution decode, one bicubic resize) against the
+default fast path (JPEG draft scaling, box reduction before the resize) on
+large synthetic X-rays and on ``--sample-dir`` images. Reports decode +
+preprocess latency, decoded megapixels and the pixel difference of the
+224x224 inputs. With a model (omit ``--no-model``) it also compares
+predictions (label flips near 0.5 are counted) and exits with status 1 if
+any probability moves by more than ``--tolerance``.
+"""
+
+import argparse
+import io
+import json
+import sys
+
+import numpy as np
+
+import inference
+from benchmarks.end_to_end import FORMATS, encode, synthetic_xray
+from benchmarks.single_image_latency import summarize, time_calls
+
+LARGE_SIZES = ((2048, 2048), (2500, 3000), (3000, 3000), (4096, 4096))
+
+def load_inputs(sample_dir=None, sample_limit=200):
+    inputs = []
+    for width, height in LARGE_SIZES:
+        image = synthetic_xray(width, height, seed=width + height)
+        for image_format in FORMATS:
+            inputs.append((f"synthetic_{width}x{height}.{image_format.lower()}", encode(image, image_format)))
+    if sample_dir:
+        for path, _ in inference.list_images(sample_dir)[:sample_limit]:
+            with open(path, "rb") as f:
+                inputs.append((path, f.read()))
+    return inputs
+
+def decode(content, fast):
+    image = inference.open_image(io.BytesIO(content), fast=fast)
+    megapixels = image.size[0] * image.size[1] / 1e6
+    return inference.prepare_image_array(image, fast=fast), megapixels
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=inference.MODEL_PATH)
+    parser.add_argument("--backend", default="keras")
+    parser.add_argument("--no-model", action="store_true", help="Skip the prediction parity check")
+    parser.add_argument("--sample-dir", help="Class-per-folder tree of real X-rays, e.g. chest_xray/test")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Max allowed probability difference")
+    parser.add_argument("--output", help="Optional JSON file for the report")
+    args = parser.parse_args()
+
+    inputs = load_inputs(args.sample_dir)
+    report = {"timing": {}, "parity": {}}
+
+    print(f"{'input':<34}{'full ms':>9}{'fast ms':>9}{'speedup':>9}{'full MP':>9}{'fast MP':>9}")
+    for name, content in inputs[:2 * len(LARGE_SIZES)]:
+        entry = {}
+        for label, fast in (("full", False), ("fast", True)):
+            entry[label] = summarize(time_calls(lambda: decode(content, fast), args.iterations))
+            entry[label]["decoded_megapixels"] = decode(content, fast)[1]
+        entry["speedup_p50"] = entry["full"]["p50_ms"] / entry["fast"]["p50_ms"]
+        report["timing"][name] = entry
+        print(f"{name:<34}{entry['full']['p50_ms']:>9.1f}{entry['fast']['p50_ms']:>9.1f}"
+              f"{entry['speedup_p50']:>9.2f}{entry['full']['decoded_megapixels']:>9.2f}"
+              f"{entry['fast']['decoded_megapixels']:>9.3f}")
+
+    full = np.stack([decode(content, False)[0] for _, content in inputs])
+    fast = np.stack([decode(content, True)[0] for _, content in inputs])
+    pixel_diff = np.abs(full.astype(np.int16) - fast.astype(np.int16))
+    report["parity"]["pixels"] = {
+        "max_abs_diff": int(pixel_diff.max()),
+        "mean_abs_diff": float(pixel_diff.mean()),
+    }
+    print(f"\n224x224 input difference: max {pixel_diff.max()}, mean {pixel_diff.mean():.3f} grey levels")
+
+    failed = False
+    if not args.no_model:
+        model = inference.load_model(args.model, args.backend)
+        probs_full = np.array(inference.predict_in_batches(model, list(full)))
+        probs_fast = np.array(inference.predict_in_batches(model, list(fast)))
+        prob_diff = np.abs(probs_full - probs_fast)
+        flips = int(np.sum((probs_full > 0.5) != (probs_fast > 0.5)))
+        report["parity"]["predictions"] = {
+            "images": len(inputs),
+            "max_abs_diff": float(prob_diff.max()),
+            "mean_abs_diff": float(prob_diff.mean()),
+            "label_flips": flips,
+            "tolerance": args.tolerance,
+        }
+        print(f"Probability difference: max {prob_diff.max():.4f}, mean {prob_diff.mean():.4f}, "
+              f"{flips} label flip(s) over {len(inputs)} images")
+        failed = prob_diff.max() > args.tolerance
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if failed:
+        print(f"Fast decode is outside the tolerance of {args.tolerance}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Cost of a Grad-CAM heatmap on top of the prediction it comes with
+
+Run from the repository root:
+
+    python -m benchmarks.gradcam_latency --test-dir chest_xray/test --output gradcam.json
+
+Times ``predict_batch`` against ``gradcam.GradCAM.explain_batch`` (the
+probability and the heatmap from one pass) at each batch size, and checks
+that the explained probabilities match the plain predictions. Exits with
+status 1 if the p50 overhead is above ``--max-overhead`` (a fraction of the
+prediction latency) or a probability differs by more than ``--tolerance``.
+Keras backend only.
+"""
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+import inference
+from benchmarks.backend_parity import load_split
+from benchmarks.single_image_latency import summarize, time_calls
+from gradcam import GradCAM
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=inference.MODEL_PATH)
+    parser.add_argument("--precision", default="float32")
+    parser.add_argument("--test-dir", help="Class-per-folder images; random arrays when omitted")
+    parser.add_argument("--limit", type=int, default=64, help="Images used for the parity check")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--max-overhead", type=float, default=0.3, help="Allowed p50 slowdown, e.g. 0.3 = 30%%")
+    parser.add_argument("--tolerance", type=float, default=1e-3, help="Max allowed probability difference")
+    parser.add_argument("--output", help="Optional JSON file for the report")
+    args = parser.parse_args()
+
+    if args.test_dir:
+        arrays, _ = load_split(args.test_dir, args.limit)
+    else:
+        rng = np.random.default_rng(0)
+        arrays = rng.integers(0, 256, (args.limit, inference.IMAGE_SIZE, inference.IMAGE_SIZE, 1), dtype=np.uint8)
+    model = inference.load_model(args.model, "keras", args.precision)
+    explainer = GradCAM(model)
+    explainer.warmup(args.batch_sizes)
+
+    report = {"latency": {}, "parity": {}}
+    failed = False
+    print(f"{'batch':>6}{'predict p50':>13}{'explain p50':>13}{'overhead':>10}  (ms)")
+    for batch_size in args.batch_sizes:
+        batch = arrays[:batch_size]
+        predict = summarize(time_calls(lambda: model.predict_batch(batch), args.iterations))
+        explain = summarize(time_calls(lambda: explainer.explain_batch(batch), args.iterations))
+        overhead = explain["p50_ms"] / predict["p50_ms"] - 1
+        report["latency"][batch_size] = {"predict": predict, "explain": explain, "overhead_p50": overhead}
+        print(f"{batch_size:>6}{predict['p50_ms']:>13.1f}{explain['p50_ms']:>13.1f}{overhead:>10.1%}")
+        failed |= overhead > args.max_overhead
+
+    probs = np.array(inference.predict_in_batches(model, list(arrays)))
+    explained = np.concatenate([
+        explainer.explain_batch(arrays[i:i + inference.BATCH_SIZE])[0]
+        for i in range(0, len(arrays), inference.BATCH_SIZE)
+    ])
+    prob_diff = np.abs(probs - explained)
+    report["parity"] = {
+        "images": len(arrays),
+        "max_abs_diff": float(prob_diff.max()),
+        "tolerance": args.tolerance,
+    }
+    print(f"\nProbability difference over {len(arrays)} images: max {prob_diff.max():.2e}")
+    failed |= prob_diff.max() > args.tolerance
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if failed:
+        print(f"Grad-CAM is over the {args.max_overhead:.0%} overhead budget or outside the tolerance")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""float32 vs mixed_bfloat16: training step time, inference latency and test accuracy
+
+Run from the repository root:
+
+    python -m benchmarks.mixed_precision --test-dir chest_xray/test --output bf16.json
+
+By default the trained float32 model is served in both precisions. Pass
+``--bf16-model`` to compare against a model trained with
+``--mixed-precision mixed_bfloat16`` instead. Exits with status 1 if bf16
+test accuracy falls more than ``--max-accuracy-drop`` below float32.
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers
+
+import inference
+from backends import KerasBackend
+from benchmarks.backend_parity import latency_ms, load_split
+from model_layers import GrayscaleToResNetInput
+
+TRAIN_BATCH_SIZE = 32
+
+def build_phase2_model():
+    """Training-script architecture with the Phase 2 trainable layers, random weights"""
+    size = inference.IMAGE_SIZE
+    base = tf.keras.applications.ResNet50(weights=None, include_top=False, input_shape=(size, size, 3))
+    for layer in base.layers[:-30]:
+        layer.trainable = False
+    inputs = tf.keras.Input(shape=(size, size, 1))
+    x = base(GrayscaleToResNetInput()(inputs), training=False)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dropout(0.3)(layers.Dense(128, activation="relu")(x))
+    outputs = layers.Dense(1, activation="sigmoid", dtype="float32")(x)
+    model = tf.keras.Model(inputs, outputs)
+    model.compile(optimizer=tf.keras.optimizers.Adam(1e-5), loss="binary_crossentropy")
+    return model
+
+def train_step_ms(policy, steps, warmup=3):
+    """Median train_on_batch time under a global dtype policy"""
+    tf.keras.mixed_precision.set_global_policy(policy)
+    try:
+        model = build_phase2_model()
+        rng = np.random.default_rng(0)
+        size = inference.IMAGE_SIZE
+        x = rng.integers(0, 256, (TRAIN_BATCH_SIZE, size, size, 1)).astype(np.float32)
+        y = rng.integers(0, 2, (TRAIN_BATCH_SIZE, 1)).astype(np.float32)
+        for _ in range(warmup):
+            model.train_on_batch(x, y)
+        timings = []
+        for _ in range(steps):
+            start = time.perf_counter()
+            model.train_on_batch(x, y)
+            timings.append((time.perf_counter() - start) * 1000)
+        return float(np.median(timings))
+    finally:
+        tf.keras.mixed_precision.set_global_policy("float32")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=inference.MODEL_PATH, help="float32-trained model")
+    parser.add_argument("--bf16-model", help="Model trained with mixed_bfloat16 (default: --model)")
+    parser.add_argument("--test-dir", help="Test split for accuracy (skipped if omitted)")
+    parser.add_argument("--train-steps", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--max-accuracy-drop", type=float, default=0.005)
+    parser.add_argument("--output", help="Optional JSON file for the report")
+    args = parser.parse_args()
+
+    report = {"float32": {}, "bfloat16": {}}
+    report["float32"]["train_step_ms"] = train_step_ms("float32", args.train_steps)
+    report["bfloat16"]["train_step_ms"] = train_step_ms("mixed_bfloat16", args.train_steps)
+
+    models = {
+        "float32": KerasBackend(args.model, "float32"),
+        "bfloat16": KerasBackend(args.bf16_model or args.model, "bfloat16"),
+    }
+    if args.test_dir:
+        arrays, labels = load_split(args.test_dir)
+    else:
+        arrays = np.random.default_rng(0).integers(
+            0, 256, (inference.BATCH_SIZE, inference.IMAGE_SIZE, inference.IMAGE_SIZE, 1), dtype=np.uint8
+        )
+        labels = None
+
+    for name, model in models.items():
+        model.warmup()
+        report[name]["latency_batch1_ms"] = latency_ms(model, arrays, 1, args.iterations)
+        report[name][f"latency_batch{inference.BATCH_SIZE}_ms"] = latency_ms(
+            model, arrays, inference.BATCH_SIZE, args.iterations
+        )
+        if labels is not None:
+            probs = np.array(inference.predict_in_batches(model, list(arrays)))
+            report[name]["accuracy"] = float(np.mean((probs > 0.5) == labels))
+
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if labels is not None:
+        drop = report["float32"]["accuracy"] - report["bfloat16"]["accuracy"]
+        if drop > args.max_accuracy_drop:
+            print(f"bf16 accuracy is {drop:.4f} below float32 (limit {args.max_accuracy_drop})")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Images/sec of Phase 2 fine-tuning with 1, 2, 4 and 8 local data-parallel workers
+
+Run from the repository root:
+
+    python -m benchmarks.multiworker_scaling --workers 1 2 4 8 --output scaling.json
+
+Each configuration is started with launch_workers.launch (cores split evenly
+across workers) and trains the Phase 2 architecture on synthetic batches of
+32 images per worker. Each worker feeds whole global batches, which
+tf.distribute splits across the replicas, so every worker steps on its own 32
+images. One warm-up epoch is excluded from the timing.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import launch_workers
+
+PER_WORKER_BATCH = 32
+
+def run_worker(steps, result_path):
+    """Body of one worker process (TF_CONFIG set by the launcher)"""
+    import numpy as np
+    import tensorflow as tf
+
+    from benchmarks.mixed_precision import build_phase2_model
+    import inference
+
+    tf_config = json.loads(os.environ.get("TF_CONFIG", "{}"))
+    num_workers = len(tf_config.get("cluster", {}).get("worker", [])) or 1
+    strategy = (tf.distribute.MultiWorkerMirroredStrategy() if num_workers > 1
+                else tf.distribute.get_strategy())
+
+    global_batch = PER_WORKER_BATCH * strategy.num_replicas_in_sync
+    size = inference.IMAGE_SIZE
+    rng = np.random.default_rng(tf_config.get("task", {}).get("index", 0))
+    x = rng.integers(0, 256, (global_batch, size, size, 1)).astype(np.float32)
+    y = rng.integers(0, 2, (global_batch, 1)).astype(np.float32)
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+    ds = tf.data.Dataset.from_tensors((x, y)).repeat().with_options(options)
+
+    with strategy.scope():
+        model = build_phase2_model()
+
+    model.fit(ds, steps_per_epoch=max(2, steps // 5), epochs=1, verbose=0)  # Warm-up
+    start = time.perf_counter()
+    model.fit(ds, steps_per_epoch=steps, epochs=1, verbose=0)
+    elapsed = time.perf_counter() - start
+
+    if tf_config.get("task", {}).get("index", 0) == 0:
+        with open(result_path, "w") as f:
+            json.dump({
+                "workers": num_workers,
+                "global_batch": global_batch,
+                "step_ms": elapsed / steps * 1000,
+                "images_per_sec": global_batch * steps / elapsed,
+            }, f)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--steps", type=int, default=30)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.steps, args.result)
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_workers in args.workers:
+            result_path = os.path.join(tmp, f"{num_workers}.json")
+            command = [sys.executable, "-m", "benchmarks.multiworker_scaling", "--worker",
+                       "--steps", str(args.steps), "--result", result_path]
+            if launch_workers.launch(command, num_workers) != 0:
+                print(f"{num_workers} worker(s): failed")
+                continue
+            with open(result_path) as f:
+                results.append(json.load(f))
+
+    baseline = results[0]["images_per_sec"] if results else None
+    print(f"{'workers':>8}{'global batch':>14}{'step ms':>10}{'img/s':>10}{'speedup':>9}")
+    for r in results:
+        r["speedup"] = r["images_per_sec"] / baseline
+        print(f"{r['workers']:>8}{r['global_batch']:>14}{r['step_ms']:>10.1f}"
+              f"{r['images_per_sec']:>10.1f}{r['speedup']:>9.2f}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
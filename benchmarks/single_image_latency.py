@@ -0,0 +1,74 @@
+"""Single-image latency: Keras model.predict vs the compiled inference path
+
+Run from the repository root:
+
+    python -m benchmarks.single_image_latency --iterations 200 --output latency.json
+"""
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+import inference
+from backends import KerasBackend
+
+def time_calls(fn, iterations):
+    """Per-call wall time in milliseconds"""
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+def summarize(timings):
+    return {
+        "mean_ms": float(np.mean(timings)),
+        "p50_ms": float(np.percentile(timings, 50)),
+        "p95_ms": float(np.percentile(timings, 95)),
+        "p99_ms": float(np.percentile(timings, 99)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=inference.MODEL_PATH)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    compiled = KerasBackend(args.model)
+    keras_model = compiled.model
+    gray = np.random.default_rng(0).integers(
+        0, 256, (1, inference.IMAGE_SIZE, inference.IMAGE_SIZE, 1), dtype=np.uint8
+    )
+    model_input = inference.to_resnet_input(gray) if compiled.input_channels == 3 else gray
+
+    candidates = {
+        "keras_predict": lambda: keras_model.predict(model_input, verbose=0),
+        "compiled": lambda: compiled.predict_batch(gray),
+    }
+    results = {}
+    for name, fn in candidates.items():
+        time_calls(fn, args.warmup)
+        results[name] = summarize(time_calls(fn, args.iterations))
+
+    np.testing.assert_allclose(
+        keras_model.predict(model_input, verbose=0)[:, 0], compiled.predict_batch(gray), atol=1e-5
+    )
+    results["speedup_p50"] = results["keras_predict"]["p50_ms"] / results["compiled"]["p50_ms"]
+
+    print(f"{'path':<16}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}  (ms)")
+    for name in candidates:
+        r = results[name]
+        print(f"{name:<16}{r['mean_ms']:>10.2f}{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+    print(f"p50 speedup: {results['speedup_p50']:.2f}x")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -5,272 +5,613 @@ Automatically generated by Colab.
 
 Original file is located at
     https://colab.research.google.com/drive/1VdIvcRUoC9LaaJzyol5x2W5pD3tGPYlr
+
+Headless training entry point (no Drive mount, no plot window):
+
+    python chest_xray_modified.py --data-root chest_xray --output chest_xray_model_fixed.keras \\
+        --phase1-epochs 10 --phase2-epochs 5 --log training_log.jsonl
+
+One JSON line per epoch goes to ``--log`` (see training_telemetry.py): step
+time, images/sec, input-pipeline wait, peak memory and the epoch's metrics.
+
+``--distill-teacher`` trains a compact student against an already trained
+model instead (see distillation.py):
+
+    python chest_xray_modified.py --distill-teacher chest_xray_model_fixed.keras \\
+        --student mobilenet_v3_small --output chest_xray_model_mobilenet.keras
 """
 
 # CORRECTED CHEST X-RAY PNEUMONIA DETECTION MODEL
 # Fixes: Prevents double-training overfitting
 
 
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+
 import tensorflow as tf
-from tensorflow import keras
 from tensorflow.keras import layers
-import os
-from tensorflow.keras.applications.resnet50 import preprocess_input
 from tensorflow.keras.applications import ResNet50
 from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau
-import numpy as np
-
-
-# 1. DATA LOADING & PREPROCESSING
-
-
 
-from google.colab import drive
-drive.mount('/content/drive')
+# In-graph preprocessing shared with the app (model_layers.py must sit next to this script)
+from model_layers import GrayscaleToResNetInput
+import distillation
+import feature_cache
+import input_profiler
+import sharded_dataset
+from training_telemetry import EpochTelemetry, InputTimer, write_record
 
-drive_path = '/content/drive/MyDrive/chest_xray'
-IMAGE_SIZE = 224
-BATCH_SIZE = 32
 AUTOTUNE = tf.data.AUTOTUNE
 
-# Load datasets
-train_ds = tf.keras.preprocessing.image_dataset_from_directory(
-    os.path.join(drive_path, 'train'),
-    color_mode='grayscale',
-    shuffle=True,
-    image_size=(IMAGE_SIZE, IMAGE_SIZE),
-    batch_size=BATCH_SIZE
-)
-
-val_ds = tf.keras.preprocessing.image_dataset_from_directory(
-    os.path.join(drive_path, 'val'),
-    color_mode='grayscale',
-    shuffle=False,
-    image_size=(IMAGE_SIZE, IMAGE_SIZE),
-    batch_size=BATCH_SIZE
-)
-
-test_ds = tf.keras.preprocessing.image_dataset_from_directory(
-    os.path.join(drive_path, 'test'),
-    color_mode='grayscale',
-    shuffle=False,
-    image_size=(IMAGE_SIZE, IMAGE_SIZE),
-    batch_size=BATCH_SIZE
-)
-
-print(f"Train batches: {tf.data.experimental.cardinality(train_ds).numpy()}")
-print(f"Val batches: {tf.data.experimental.cardinality(val_ds).numpy()}")
-print(f"Test batches: {tf.data.experimental.cardinality(test_ds).numpy()}")
-
-
-# 2. DATA AUGMENTATION (ONLY FOR TRAINING)
-
-
-def grayscale_to_rgb(image, label):
-    """Convert grayscale to RGB for ResNet50"""
-    image = tf.image.grayscale_to_rgb(image)
-    return image, label
-
-def preprocess_fn(image, label):
-    """Apply ResNet50 preprocessing"""
-    image = preprocess_input(image)
-    return image, label
-
-# Data augmentation pipeline (only for training)
-data_augmentation = tf.keras.Sequential([
-    layers.RandomFlip("horizontal"),
-    layers.RandomRotation(0.1),
-    layers.RandomZoom(0.1),
-])
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train the pneumonia classifier (ResNet50, two phases)")
+    parser.add_argument("--data-root", default="chest_xray", help="Folder with train/val/test class subfolders")
+    parser.add_argument("--shards-dir", help="Pre-decoded shards from convert_dataset.py (instead of --data-root)")
+    parser.add_argument("--output", help="Where to save the trained model "
+                        "(default chest_xray_model_fixed.keras, or chest_xray_model_<student>.keras)")
+    parser.add_argument("--image-size", type=int, default=224)
+    parser.add_argument("--batch-size", type=int, default=32, help="Images per step on each worker")
+    parser.add_argument("--phase1-epochs", type=int, default=10, help="Frozen-base epochs (max, early stopping)")
+    parser.add_argument("--phase2-epochs", type=int, default=5, help="Fine-tuning epochs (max, early stopping)")
+    parser.add_argument("--shuffle-buffer", type=int, default=2048)
+    parser.add_argument("--seed", type=int, default=1337,
+                        help="Initial file order; must match on every worker so their shards are disjoint")
+    # Phase 1 feature cache (opt-in): run the frozen backbone once and train the head
+    # on stored pooled features. The head then sees feature-copies - 1 fixed augmented
+    # views per image instead of fresh augmentation every epoch, which changes results.
+    parser.add_argument("--feature-cache", action="store_true",
+                        help="Train the Phase 1 head on cached backbone features")
+    parser.add_argument("--feature-copies", type=int, default=4)
+    parser.add_argument("--feature-cache-dir", default="feature_cache")
+    # 'mixed_bfloat16' runs both phases with bf16 compute (float32 weights) on
+    # CPUs with bf16 support
+    parser.add_argument("--mixed-precision", choices=["mixed_bfloat16"], help="Global Keras dtype policy")
+    parser.add_argument("--log", default="training_log.jsonl", help="JSON-lines epoch telemetry ('-' for stdout)")
+    parser.add_argument("--plot", help="Optional PNG path for the accuracy curves")
+    # Off by default: the timing wrapper is a Python generator in the input path,
+    # which slows the pipeline it is measuring
+    parser.add_argument("--time-input", action="store_true",
+                        help="Log seconds per epoch the training loop waited on the input pipeline")
+    parser.add_argument("--profile-input", action="store_true",
+                        help="Profile the input pipeline against model compute instead of training")
+    parser.add_argument("--profile-batches", type=int, default=50, help="Batches timed per profile measurement")
+    # Distillation: train a small student against a trained teacher instead of the two phases
+    parser.add_argument("--distill-teacher", help="Trained .keras model to distill from")
+    parser.add_argument("--student", choices=sorted(distillation.STUDENTS), default="mobilenet_v3_small")
+    parser.add_argument("--distill-epochs", type=int, default=20, help="Student epochs (max, early stopping)")
+    parser.add_argument("--temperature", type=float, default=4.0, help="Softening of the teacher's output")
+    parser.add_argument("--distill-alpha", type=float, default=0.3, help="Weight of the hard-label loss")
+    parser.add_argument("--verbose", type=int, default=2, choices=[0, 1, 2], help="Keras fit verbosity")
+    args = parser.parse_args(argv)
+    if args.output is None:
+        args.output = (f"chest_xray_model_{args.student}.keras" if args.distill_teacher
+                       else "chest_xray_model_fixed.keras")
+    if args.distill_teacher and os.path.abspath(args.output) == os.path.abspath(args.distill_teacher):
+        parser.error("--output would overwrite the teacher")
+    return args
 
-def augment_fn(image, label):
-    """Apply augmentation with training flag"""
-    image = data_augmentation(image, training=True)
-    return image, label
 
-# Convert to RGB first
-train_ds = train_ds.map(grayscale_to_rgb, num_parallel_calls=AUTOTUNE)
-val_ds = val_ds.map(grayscale_to_rgb, num_parallel_calls=AUTOTUNE)
-test_ds = test_ds.map(grayscale_to_rgb, num_parallel_calls=AUTOTUNE)
+# 1. DATA LOADING & PREPROCESSING
 
-# Apply augmentation ONLY to training data
-train_ds = train_ds.map(augment_fn, num_parallel_calls=AUTOTUNE)
-train_ds = train_ds.map(preprocess_fn, num_parallel_calls=AUTOTUNE)
 
-# Preprocess validation & test (NO augmentation)
-val_ds = val_ds.map(preprocess_fn, num_parallel_calls=AUTOTUNE)
-test_ds = test_ds.map(preprocess_fn, num_parallel_calls=AUTOTUNE)
+def configure_strategy():
+    """(strategy, num_workers, worker_index) from TF_CONFIG
+
+    Data parallelism: launch_workers.py starts one process per worker with
+    TF_CONFIG set. Each worker trains on its own shard of the training set
+    with --batch-size images per step, so the global batch and the learning
+    rates scale linearly with the number of workers. Without TF_CONFIG this
+    is a single process on the default strategy.
+    """
+    tf_config = json.loads(os.environ.get('TF_CONFIG', '{}'))
+    num_workers = len(tf_config.get('cluster', {}).get('worker', [])) or 1
+    worker_index = tf_config.get('task', {}).get('index', 0)
+    strategy = (tf.distribute.MultiWorkerMirroredStrategy() if num_workers > 1
+                else tf.distribute.get_strategy())
+    return strategy, num_workers, worker_index
+
+def load_datasets(args, num_workers, worker_index):
+    """Batched grayscale (train, val, test) datasets and the training image count"""
+    if args.shards_dir:
+        train_ds = sharded_dataset.make_dataset(
+            args.shards_dir, 'train', args.batch_size, shuffle=True,
+            num_shards=num_workers, shard_index=worker_index
+        )
+        train_count = sharded_dataset.load_manifest(args.shards_dir)['splits']['train']['count']
+        val_ds = sharded_dataset.make_dataset(args.shards_dir, 'val', args.batch_size)
+        test_ds = sharded_dataset.make_dataset(args.shards_dir, 'test', args.batch_size)
+        return train_ds, val_ds, test_ds, train_count
+
+    def from_directory(split, shuffle):
+        # The same seed on every worker gives every worker the same file order,
+        # so build_pipelines' .shard() splits it into disjoint, complete shards.
+        # Per-epoch shuffling happens after the shard and cache.
+        return tf.keras.preprocessing.image_dataset_from_directory(
+            os.path.join(args.data_root, split),
+            color_mode='grayscale',
+            shuffle=shuffle,
+            seed=args.seed if shuffle else None,
+            image_size=(args.image_size, args.image_size),
+            batch_size=args.batch_size
+        )
+
+    train_ds = from_directory('train', True)
+    return train_ds, from_directory('val', False), from_directory('test', False), len(train_ds.file_paths)
+
+
+def split_fingerprint(args, split, ds):
+    """(SHA-256, image count) identifying what a split holds, for the feature cache key
+
+    Shards: the split's manifest entry, which lists every path and label.
+    Directories: the sorted file paths (the class folder is the label) with
+    their sizes and mtimes, so added, removed, relabelled or edited images all
+    change it.
+    """
+    if args.shards_dir:
+        entry = sharded_dataset.load_manifest(args.shards_dir)['splits'][split]
+        digest = hashlib.sha256(json.dumps(entry, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest(), entry['count']
+    digest = hashlib.sha256()
+    split_dir = os.path.join(args.data_root, split)
+    for path in sorted(ds.file_paths):
+        stat = os.stat(path)
+        name = os.path.relpath(path, split_dir)
+        digest.update(f"{name}\0{stat.st_size}\0{stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest(), len(ds.file_paths)
+
+
+# 2. COMPACT CACHE + DATA AUGMENTATION (ONLY FOR TRAINING)
+# Images stay single-channel grayscale in [0, 255]; channel expansion and
+# ResNet50 preprocessing happen inside the model (GrayscaleToResNetInput),
+# so the saved model takes exactly what the app feeds it.
+#
+# The cache holds decoded uint8 grayscale images (1/12 the size of
+# three-channel float32), and shuffling and augmentation run after it, so
+# every epoch sees a fresh order and fresh augmentations.
+
+def to_uint8(image, label):
+    """Compact cache format: resized grayscale pixels rounded back to uint8"""
+    if image.dtype != tf.uint8:  # Shards are already uint8
+        image = tf.cast(tf.clip_by_value(tf.round(image), 0, 255), tf.uint8)
+    return image, label
 
-# Cache and prefetch for performance
-train_ds = train_ds.cache().prefetch(AUTOTUNE)
-val_ds = val_ds.cache().prefetch(AUTOTUNE)
-test_ds = test_ds.cache().prefetch(AUTOTUNE)
+def to_float(image, label):
+    """Model input dtype (values stay in [0, 255])"""
+    return tf.cast(image, tf.float32), label
+
+def make_augmentation():
+    """Data augmentation pipeline (only for training)"""
+    return tf.keras.Sequential([
+        layers.RandomFlip("horizontal"),
+        layers.RandomRotation(0.1),
+        layers.RandomZoom(0.1),
+    ])
+
+def make_augment_fn(data_augmentation):
+    def augment_fn(image, label):
+        """Apply augmentation with training flag"""
+        image = data_augmentation(tf.cast(image, tf.float32), training=True)
+        return image, label
+    return augment_fn
+
+def build_pipelines(args, train_ds, val_ds, test_ds, data_augmentation, num_workers, worker_index,
+                    global_batch_size):
+    """(train, train_clean, val, test) input pipelines around the uint8 cache"""
+    augment_fn = make_augment_fn(data_augmentation)
+
+    # Decode once into an unbatched uint8 cache (this worker's shard only)
+    train_cached = train_ds.map(to_uint8, num_parallel_calls=AUTOTUNE).unbatch()
+    if num_workers > 1 and not args.shards_dir:
+        train_cached = train_cached.shard(num_workers, worker_index)
+    train_cached = train_cached.cache()
+    val_ds = val_ds.map(to_uint8, num_parallel_calls=AUTOTUNE).cache()
+    test_ds = test_ds.map(to_uint8, num_parallel_calls=AUTOTUNE).cache()
+
+    # Un-augmented training images, used to build the Phase 1 feature cache
+    train_ds_clean = train_cached.batch(args.batch_size).map(to_float, num_parallel_calls=AUTOTUNE)
+
+    # Reshuffle and augment per epoch, AFTER the cache (training data only).
+    # tf.distribute treats each batch as the global batch and splits it across
+    # all replicas, so every worker batches its shard at the global size to
+    # step on --batch-size images of its own
+    train_ds = (
+        train_cached
+        .shuffle(args.shuffle_buffer, reshuffle_each_iteration=True)
+        .batch(global_batch_size)
+        .map(augment_fn, num_parallel_calls=AUTOTUNE)
+        .prefetch(AUTOTUNE)
+    )
+    val_ds = val_ds.map(to_float, num_parallel_calls=AUTOTUNE).prefetch(AUTOTUNE)
+    test_ds = test_ds.map(to_float, num_parallel_calls=AUTOTUNE).prefetch(AUTOTUNE)
+
+    # Shards are uneven by up to one batch, so multi-worker epochs are a fixed
+    # number of steps over a repeated stream to keep the workers in lockstep
+    if num_workers > 1:
+        train_ds = train_ds.repeat()
+
+    # Inputs are sharded explicitly above; stop tf.distribute from re-sharding
+    distribute_options = tf.data.Options()
+    distribute_options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+    return tuple(ds.with_options(distribute_options) for ds in (train_ds, train_ds_clean, val_ds, test_ds))
+
+
+def profile_input(args, train_ds, data_augmentation, model, base_model):
+    """--profile-input: time each training-pipeline stage, the model alone and both together"""
+    augment_fn = make_augment_fn(data_augmentation)
+    uint8 = train_ds.map(to_uint8, num_parallel_calls=AUTOTUNE)
+    cached = uint8.unbatch().cache()
+    batched = cached.shuffle(args.shuffle_buffer, reshuffle_each_iteration=True).batch(args.batch_size)
+    augmented = batched.map(augment_fn, num_parallel_calls=AUTOTUNE)
+    full = augmented.prefetch(AUTOTUNE)
+
+    # One pass fills the in-memory cache (what the first epoch pays for)
+    fill_s, fill_images = input_profiler.full_pass(cached.batch(args.batch_size))
+    stages = input_profiler.profile_pipeline([
+        ("read+decode+resize", train_ds),
+        ("to_uint8", uint8),
+        ("cache (warm)", cached.batch(args.batch_size)),
+        ("shuffle+batch", batched),
+        ("augment", augmented),
+        ("prefetch", full),
+    ], batches=args.profile_batches)
+
+    # Phase 2 is the step the pipeline has to keep up with
+    base_model.trainable = True
+    for layer in base_model.layers[:-30]:
+        layer.trainable = False
+    model.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=1e-5), loss='binary_crossentropy')
+    batch = next(iter(full))
+    compute_ips = input_profiler.compute_images_per_sec(model.train_on_batch, batch, args.profile_batches)
+    loop_wait = input_profiler.training_loop_wait(model.train_on_batch, full.repeat(), args.profile_batches)
+
+    print_banner("INPUT PIPELINE PROFILE")
+    input_profiler.print_stages(stages)
+    print(f"\nCache fill (first epoch): {fill_images / fill_s:.1f} img/s over {fill_images} images")
+    print(input_profiler.suggest(stages, compute_ips, loop_wait, {"seconds": fill_s, "images": fill_images}))
+    write_record(args.log, {
+        "phase": "profile_input", "stages": stages, "cache_fill_images_per_sec": fill_images / fill_s,
+        "compute_images_per_sec": compute_ips, **loop_wait,
+    })
 
 
 # 3. BUILD MODEL WITH PROPER INITIALIZATION
 
 
-# Load pre-trained ResNet50 (frozen base)
-base_model = ResNet50(
-    weights='imagenet',
-    include_top=False,
-    input_shape=(IMAGE_SIZE, IMAGE_SIZE, 3)
-)
-
-# KEEP BASE FROZEN INITIALLY
-base_model.trainable = False
-
-# Build model architecture
-inputs = tf.keras.Input(shape=(IMAGE_SIZE, IMAGE_SIZE, 3))
-x = base_model(inputs, training=False)  # Use base in inference mode
-x = layers.GlobalAveragePooling2D()(x)
-x = layers.Dense(128, activation='relu')(x)  # Additional dense layer
-x = layers.Dropout(0.3)(x)  # Dropout to prevent overfitting
-outputs = layers.Dense(1, activation='sigmoid')(x)
-
-model = tf.keras.Model(inputs, outputs)
-
-
-# 4. FIRST TRAINING PHASE (FROZEN BASE ONLY)
-
-
-print("\n" + "="*60)
-print("PHASE 1: Training with frozen base (10 epochs max)")
-print("="*60)
-
-model.compile(
-    optimizer=tf.keras.optimizers.Adam(learning_rate=1e-3),
-    loss='binary_crossentropy',
-    metrics=['accuracy']
-)
-
-early_stop_phase1 = EarlyStopping(
-    monitor='val_loss',
-    patience=3,
-    restore_best_weights=True,
-    verbose=1
-)
-
-history_phase1 = model.fit(
-    train_ds,
-    validation_data=val_ds,
-    epochs=10,
-    callbacks=[early_stop_phase1],
-    verbose=1
-)
-
-# Evaluate after phase 1
-print("\nPhase 1 - Test Set Evaluation:")
-test_loss_p1, test_acc_p1 = model.evaluate(test_ds, verbose=0)
-print(f"Test Loss: {test_loss_p1:.4f}, Test Accuracy: {test_acc_p1:.4f}")
-
-# ============================================================
-# 5. SECOND TRAINING PHASE (FINE-TUNING WITH LOWER LR)
-# ============================================================
-
-print("\n" + "="*60)
-print("PHASE 2: Fine-tuning last 30 layers (5 epochs max)")
-print("="*60)
-
-# Unfreeze only the last 30 layers of the base model
-base_model.trainable = True
-for layer in base_model.layers[:-30]:  # Freeze all but last 30
-    layer.trainable = False
-
-# Use MUCH LOWER learning rate for fine-tuning
-model.compile(
-    optimizer=tf.keras.optimizers.Adam(learning_rate=1e-5),
-    loss='binary_crossentropy',
-    metrics=['accuracy']
-)
-
-# Early stopping with patience
-early_stop_phase2 = EarlyStopping(
-    monitor='val_loss',
-    patience=2,
-    restore_best_weights=True,
-    verbose=1
-)
-
-# Learning rate reduction
-reduce_lr = ReduceLROnPlateau(
-    monitor='val_loss',
-    factor=0.5,
-    patience=1,
-    min_lr=1e-7,
-    verbose=1
-)
-
-history_phase2 = model.fit(
-    train_ds,  # SAME data, but with augmentation already applied
-    validation_data=val_ds,
-    epochs=5,
-    callbacks=[early_stop_phase2, reduce_lr],
-    verbose=1
-)
-
-# ============================================================
-# 6. FINAL EVALUATION
-# ============================================================
-
-print("\n" + "="*60)
-print("FINAL EVALUATION")
-print("="*60)
-
-test_loss, test_acc = model.evaluate(test_ds, verbose=0)
-print(f"Final Test Loss: {test_loss:.4f}")
-print(f"Final Test Accuracy: {test_acc:.4f}")
-
-# ============================================================
-# 7. REGULARIZATION TECHNIQUES APPLIED
-# ============================================================
-
-print("\n" + "="*60)
-print("REGULARIZATION TECHNIQUES USED:")
-print("="*60)
-print("✓ Data Augmentation (Flip, Rotation, Zoom)")
-print("✓ Dropout (0.3) in dense layer")
-print("✓ Very low learning rate for fine-tuning (1e-5)")
-print("✓ Early Stopping with patience=2")
-print("✓ Learning Rate Reduction on plateau")
-print("✓ Frozen base model layers (-30 layers kept frozen)")
-print("✓ NO double-training on same data")
-
-# ============================================================
-# 8. SAVE MODEL
-# ============================================================
-
-drive_keras_path = '/content/drive/MyDrive/chest_xray_model_fixed.keras'
-model.save(drive_keras_path)
-print(f"\nModel saved to: {drive_keras_path}")
-
-# ============================================================
-# 9. VISUALIZATION OF TRAINING HISTORY
-# ============================================================
-
-import matplotlib.pyplot as plt
-
-fig, axes = plt.subplots(1, 2, figsize=(12, 4))
-
-# Phase 1
-axes[0].plot(history_phase1.history['accuracy'], label='Train Acc', marker='o')
-axes[0].plot(history_phase1.history['val_accuracy'], label='Val Acc', marker='s')
-axes[0].set_title('Phase 1: Frozen Base Training')
-axes[0].set_xlabel('Epoch')
-axes[0].set_ylabel('Accuracy')
-axes[0].legend()
-axes[0].grid(True, alpha=0.3)
-
-# Phase 2
-axes[1].plot(history_phase2.history['accuracy'], label='Train Acc', marker='o')
-axes[1].plot(history_phase2.history['val_accuracy'], label='Val Acc', marker='s')
-axes[1].set_title('Phase 2: Fine-tuning')
-axes[1].set_xlabel('Epoch')
-axes[1].set_ylabel('Accuracy')
-axes[1].legend()
-axes[1].grid(True, alpha=0.3)
-
-plt.tight_layout()
-plt.savefig('/content/drive/MyDrive/training_history.png', dpi=100, bbox_inches='tight')
-print("Training history plot saved!")
-plt.show()
\ No newline at end of file
+def build_model(image_size):
+    """(model, base_model, feature_model, head_layers); call under the strategy scope
+
+    Head layers are kept as objects so the feature-cache head model shares
+    their weights; feature_model maps the input to the pooled backbone output.
+    """
+    # Load pre-trained ResNet50 (frozen base)
+    base_model = ResNet50(
+        weights='imagenet',
+        include_top=False,
+        input_shape=(image_size, image_size, 3)
+    )
+
+    # KEEP BASE FROZEN INITIALLY
+    base_model.trainable = False
+
+    # Build model architecture: (N, H, W, 1) grayscale in, preprocessing in-graph
+    inputs = tf.keras.Input(shape=(image_size, image_size, 1))
+    x = GrayscaleToResNetInput(name="resnet_preprocessing")(inputs)
+    x = base_model(x, training=False)  # Use base in inference mode
+    pooled = layers.GlobalAveragePooling2D()(x)
+
+    head_dense = layers.Dense(128, activation='relu')  # Additional dense layer
+    head_dropout = layers.Dropout(0.3)  # Dropout to prevent overfitting
+    head_output = layers.Dense(1, activation='sigmoid', dtype='float32')  # float32 output under mixed precision
+    outputs = head_output(head_dropout(head_dense(pooled)))
+
+    model = tf.keras.Model(inputs, outputs)
+    feature_model = tf.keras.Model(inputs, pooled)
+    return model, base_model, feature_model, (head_dense, head_dropout, head_output)
+
+def run_distillation(args, strategy, train_input, train_timer, val_ds, test_ds, steps_per_epoch,
+                     log_path, run_info, lr_scale, is_chief):
+    """--distill-teacher: train and save a student, then compare it with the teacher on test"""
+    print_banner(f"DISTILLATION: {args.student} from {args.distill_teacher} "
+                 f"({args.distill_epochs} epochs max, T={args.temperature}, alpha={args.distill_alpha})")
+
+    with strategy.scope():
+        teacher = distillation.load_teacher(args.distill_teacher)
+        student, logits_model = distillation.build_student(args.student, args.image_size)
+        distiller = distillation.Distiller(
+            student, logits_model, teacher, temperature=args.temperature, alpha=args.distill_alpha
+        )
+        # The ImageNet backbone is fine-tuned end to end, so start well below Phase 1's rate
+        distiller.compile(optimizer=tf.keras.optimizers.Adam(learning_rate=1e-4 * lr_scale))
+    print(f"Teacher: {teacher.count_params():,} params, student: {student.count_params():,} params")
+
+    distiller.fit(
+        train_input,
+        validation_data=val_ds,
+        steps_per_epoch=steps_per_epoch,
+        epochs=args.distill_epochs,
+        callbacks=[
+            EarlyStopping(monitor='val_loss', patience=3, restore_best_weights=True, verbose=1),
+            ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=1, min_lr=1e-7, verbose=1),
+            EpochTelemetry(log_path, 'distill', run_info["global_batch_size"], train_timer,
+                           {**run_info, "student": args.student}),
+        ],
+        verbose=args.verbose
+    )
+
+    print_banner("FINAL EVALUATION")
+    results = {}
+    with strategy.scope():
+        for name, model in (("teacher", teacher), ("student", student)):
+            model.compile(loss='binary_crossentropy', metrics=['accuracy'])
+            test_loss, test_acc = model.evaluate(test_ds, verbose=0)
+            results[name] = {"params": model.count_params(), "test_loss": test_loss, "test_accuracy": test_acc}
+            print(f"{name:<8} {model.count_params():>12,} params  "
+                  f"Test Loss: {test_loss:.4f}, Test Accuracy: {test_acc:.4f}")
+    print(f"Latency/accuracy table: python -m benchmarks.distillation --student {args.output} --test-dir <test split>")
+    write_record(log_path, {"phase": "distill_eval", **results, **run_info})
+
+    save_model(student, args.output, is_chief)
+
+def save_model(model, path, is_chief):
+    if is_chief:
+        model.save(path)
+        print(f"\nModel saved to: {path}")
+    else:
+        # Every worker takes part in saving; only the chief's copy is kept
+        with tempfile.TemporaryDirectory() as worker_dir:
+            model.save(os.path.join(worker_dir, 'model.keras'))
+
+def print_banner(title):
+    print("\n" + "="*60)
+    print(title)
+    print("="*60)
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.mixed_precision:
+        tf.keras.mixed_precision.set_global_policy(args.mixed_precision)
+
+    strategy, num_workers, worker_index = configure_strategy()
+    is_chief = worker_index == 0
+    global_batch_size = args.batch_size * strategy.num_replicas_in_sync
+    lr_scale = strategy.num_replicas_in_sync
+    use_feature_cache = args.feature_cache
+    if num_workers > 1:
+        use_feature_cache = False  # Phase 1 head training stays single-process
+        print(f"Worker {worker_index}/{num_workers}: global batch {global_batch_size}, LR x{lr_scale}")
+
+    # Load datasets
+    train_ds, val_ds, test_ds, train_count = load_datasets(args, num_workers, worker_index)
+    print(f"Train batches: {tf.data.experimental.cardinality(train_ds).numpy()}")
+    print(f"Val batches: {tf.data.experimental.cardinality(val_ds).numpy()}")
+    print(f"Test batches: {tf.data.experimental.cardinality(test_ds).numpy()}")
+
+    if use_feature_cache:
+        # Before build_pipelines replaces the datasets that know their file paths
+        train_fingerprint, val_fingerprint = (
+            split_fingerprint(args, 'train', train_ds), split_fingerprint(args, 'val', val_ds)
+        )
+
+    data_augmentation = make_augmentation()
+    if args.profile_input:
+        with strategy.scope():
+            model, base_model, _, _ = build_model(args.image_size)
+        profile_input(args, train_ds, data_augmentation, model, base_model)
+        return
+
+    train_ds, train_ds_clean, val_ds, test_ds = build_pipelines(
+        args, train_ds, val_ds, test_ds, data_augmentation, num_workers, worker_index,
+        global_batch_size
+    )
+    steps_per_epoch = train_count // global_batch_size if num_workers > 1 else None
+
+    # --time-input: time the training loop spends blocked on the input pipeline
+    train_timer = InputTimer(train_ds) if args.time_input else None
+    train_input = train_timer.dataset if train_timer is not None else train_ds
+    log_path = args.log if is_chief else os.devnull
+    run_info = {"workers": num_workers, "global_batch_size": global_batch_size}
+
+    if args.distill_teacher:
+        run_distillation(args, strategy, train_input, train_timer, val_ds, test_ds, steps_per_epoch,
+                         log_path, run_info, lr_scale, is_chief)
+        return
+
+    # Variables are created under the strategy scope so they are mirrored across workers
+    with strategy.scope():
+        model, base_model, feature_model, (head_dense, head_dropout, head_output) = build_model(args.image_size)
+
+
+    # 4. FIRST TRAINING PHASE (FROZEN BASE ONLY)
+
+
+    print_banner(f"PHASE 1: Training with frozen base ({args.phase1_epochs} epochs max)")
+
+    with strategy.scope():
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=1e-3 * lr_scale),
+            loss='binary_crossentropy',
+            metrics=['accuracy']
+        )
+
+    early_stop_phase1 = EarlyStopping(
+        monitor='val_loss',
+        patience=3,
+        restore_best_weights=True,
+        verbose=1
+    )
+
+    if use_feature_cache:
+        # The base is frozen and runs in inference mode, so its pooled output is a
+        # fixed function of the input: compute it once, then train only the head.
+        # Features computed under mixed_bfloat16 differ from float32 ones, and the
+        # split fingerprints tie each store to the images and labels it encoded
+        policy = tf.keras.mixed_precision.global_policy().name
+        train_digest, train_images = train_fingerprint
+        val_digest, val_images = val_fingerprint
+        train_features, train_labels = feature_cache.build_feature_store(
+            feature_model, train_ds_clean, os.path.join(args.feature_cache_dir, 'train'),
+            copies=args.feature_copies, augment=data_augmentation,
+            key=f"{args.shards_dir or args.data_root}/train:{args.image_size}:{policy}:{train_images}:{train_digest}",
+            count=train_images
+        )
+        val_features, val_labels = feature_cache.build_feature_store(
+            feature_model, val_ds, os.path.join(args.feature_cache_dir, 'val'),
+            key=f"{args.shards_dir or args.data_root}/val:{args.image_size}:{policy}:{val_images}:{val_digest}",
+            count=val_images
+        )
+        print(f"Feature cache: {len(train_labels)} train / {len(val_labels)} val vectors")
+
+        feature_inputs = tf.keras.Input(shape=(train_features.shape[1],))
+        head_model = tf.keras.Model(
+            feature_inputs, head_output(head_dropout(head_dense(feature_inputs)))
+        )
+        head_model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=1e-3),
+            loss='binary_crossentropy',
+            metrics=['accuracy']
+        )
+        history_phase1 = head_model.fit(
+            train_features, train_labels,
+            validation_data=(val_features, val_labels),
+            batch_size=args.batch_size,
+            shuffle=True,
+            epochs=args.phase1_epochs,
+            callbacks=[early_stop_phase1,
+                       EpochTelemetry(log_path, 'phase1_head', args.batch_size, extra=run_info)],
+            verbose=args.verbose
+        )
+    else:
+        history_phase1 = model.fit(
+            train_input,
+            validation_data=val_ds,
+            steps_per_epoch=steps_per_epoch,
+            epochs=args.phase1_epochs,
+            callbacks=[early_stop_phase1,
+                       EpochTelemetry(log_path, 'phase1', global_batch_size, train_timer, run_info)],
+            verbose=args.verbose
+        )
+
+    # Evaluate after phase 1
+    print("\nPhase 1 - Test Set Evaluation:")
+    test_loss_p1, test_acc_p1 = model.evaluate(test_ds, verbose=0)
+    print(f"Test Loss: {test_loss_p1:.4f}, Test Accuracy: {test_acc_p1:.4f}")
+
+    # ============================================================
+    # 5. SECOND TRAINING PHASE (FINE-TUNING WITH LOWER LR)
+    # ============================================================
+
+    print_banner(f"PHASE 2: Fine-tuning last 30 layers ({args.phase2_epochs} epochs max)")
+
+    # Unfreeze only the last 30 layers of the base model
+    base_model.trainable = True
+    for layer in base_model.layers[:-30]:  # Freeze all but last 30
+        layer.trainable = False
+
+    # Use MUCH LOWER learning rate for fine-tuning
+    with strategy.scope():
+        model.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=1e-5 * lr_scale),
+            loss='binary_crossentropy',
+            metrics=['accuracy']
+        )
+
+    # Early stopping with patience
+    early_stop_phase2 = EarlyStopping(
+        monitor='val_loss',
+        patience=2,
+        restore_best_weights=True,
+        verbose=1
+    )
+
+    # Learning rate reduction
+    reduce_lr = ReduceLROnPlateau(
+        monitor='val_loss',
+        factor=0.5,
+        patience=1,
+        min_lr=1e-7,
+        verbose=1
+    )
+
+    history_phase2 = model.fit(
+        train_input,  # SAME data, freshly augmented each epoch
+        validation_data=val_ds,
+        steps_per_epoch=steps_per_epoch,
+        epochs=args.phase2_epochs,
+        callbacks=[early_stop_phase2, reduce_lr,
+                   EpochTelemetry(log_path, 'phase2', global_batch_size, train_timer, run_info)],
+        verbose=args.verbose
+    )
+
+    # ============================================================
+    # 6. FINAL EVALUATION
+    # ============================================================
+
+    print_banner("FINAL EVALUATION")
+
+    test_loss, test_acc = model.evaluate(test_ds, verbose=0)
+    print(f"Final Test Loss: {test_loss:.4f}")
+    print(f"Final Test Accuracy: {test_acc:.4f}")
+
+    # ============================================================
+    # 7. REGULARIZATION TECHNIQUES APPLIED
+    # ============================================================
+
+    print_banner("REGULARIZATION TECHNIQUES USED:")
+    print("✓ Data Augmentation (Flip, Rotation, Zoom)")
+    print("✓ Dropout (0.3) in dense layer")
+    print("✓ Very low learning rate for fine-tuning (1e-5)")
+    print("✓ Early Stopping with patience=2")
+    print("✓ Learning Rate Reduction on plateau")
+    print("✓ Frozen base model layers (-30 layers kept frozen)")
+    print("✓ NO double-training on same data")
+
+    # ============================================================
+    # 8. SAVE MODEL
+    # ============================================================
+
+    save_model(model, args.output, is_chief)
+
+    # ============================================================
+    # 9. VISUALIZATION OF TRAINING HISTORY
+    # ============================================================
+
+    if args.plot and is_chief:
+        save_history_plot(history_phase1, history_phase2, args.plot)
+
+def save_history_plot(history_phase1, history_phase2, path):
+    """Accuracy curves of both phases written to a PNG (no display needed)"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(1, 2, figsize=(12, 4))
+
+    # Phase 1
+    axes[0].plot(history_phase1.history['accuracy'], label='Train Acc', marker='o')
+    axes[0].plot(history_phase1.history['val_accuracy'], label='Val Acc', marker='s')
+    axes[0].set_title('Phase 1: Frozen Base Training')
+    axes[0].set_xlabel('Epoch')
+    axes[0].set_ylabel('Accuracy')
+    axes[0].legend()
+    axes[0].grid(True, alpha=0.3)
+
+    # Phase 2
+    axes[1].plot(history_phase2.history['accuracy'], label='Train Acc', marker='o')
+    axes[1].plot(history_phase2.history['val_accuracy'], label='Val Acc', marker='s')
+    axes[1].set_title('Phase 2: Fine-tuning')
+    axes[1].set_xlabel('Epoch')
+    axes[1].set_ylabel('Accuracy')
+    axes[1].legend()
+    axes[1].grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(path, dpi=100, bbox_inches='tight')
+    plt.close(fig)
+    print("Training history plot saved!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Convert a chest X-ray folder tree into sharded fixed-record .npy files
+
+    python convert_dataset.py --data-root chest_xray --output chest_xray_shards
+
+Expects ``<data-root>/<split>/<class>/*.{jpg,jpeg,png}`` (the Kaggle layout,
+splits train/val/test). Every image is decoded, converted to grayscale and
+resized once, using the app's own ``inference.prepare_image_array``, across
+all cores. Each shard is a pair of .npy files:
+
+    <split>-00000-images.npy   uint8 (n, 224, 224, 1)
+    <split>-00000-labels.npy   uint8 (n,)
+
+``manifest.json`` lists the class names, the shard files with their source
+paths and labels per split, and the .npy header size so
+``sharded_dataset.py`` can read records directly with tf.data.
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import inference
+
+SPLITS = ("train", "val", "test")
+SHARD_SIZE = 1024
+
+def list_split(split_dir, class_names):
+    """(path, label) pairs, classes in sorted order like image_dataset_from_directory"""
+    items = []
+    for label, class_name in enumerate(class_names):
+        class_dir = os.path.join(split_dir, class_name)
+        if not os.path.isdir(class_dir):
+            continue
+        for root, _, files in os.walk(class_dir):
+            for name in sorted(files):
+                if name.lower().endswith(inference.IMAGE_EXTENSIONS):
+                    items.append((os.path.join(root, name), label))
+    return items
+
+def write_shard(job):
+    """Decode one shard's images and write its .npy pair; runs in a worker process"""
+    output_dir, split, index, items = job
+    images = np.zeros((len(items), inference.IMAGE_SIZE, inference.IMAGE_SIZE, 1), dtype=np.uint8)
+    labels = np.zeros(len(items), dtype=np.uint8)
+    kept, skipped = [], []
+    for path, label in items:
+        try:
+            with Image.open(path) as image:
+                images[len(kept)] = inference.prepare_image_array(image)
+        except Exception as e:
+            skipped.append({"path": path, "error": str(e)})
+            continue
+        labels[len(kept)] = label
+        kept.append((path, label))
+
+    prefix = f"{split}-{index:05d}"
+    header_bytes = {}
+    for kind, array in (("images", images[:len(kept)]), ("labels", labels[:len(kept)])):
+        path = os.path.join(output_dir, f"{prefix}-{kind}.npy")
+        np.save(path, array)
+        header_bytes[kind] = os.path.getsize(path) - array.nbytes
+    return {
+        "images": f"{prefix}-images.npy",
+        "labels": f"{prefix}-labels.npy",
+        "count": len(kept),
+        "header_bytes": header_bytes,
+        "paths": [path for path, _ in kept],
+        "targets": [label for _, label in kept],
+        "skipped": skipped,
+    }
+
+def convert(data_root, output_dir, shard_size=SHARD_SIZE, workers=None):
+    """Write all shards and the manifest; returns the manifest"""
+    os.makedirs(output_dir, exist_ok=True)
+    train_dir = os.path.join(data_root, "train")
+    class_names = sorted(
+        name for name in os.listdir(train_dir) if os.path.isdir(os.path.join(train_dir, name))
+    )
+
+    jobs = []
+    for split in SPLITS:
+        split_dir = os.path.join(data_root, split)
+        if not os.path.isdir(split_dir):
+            continue
+        items = list_split(split_dir, class_names)
+        for index, start in enumerate(range(0, len(items), shard_size)):
+            jobs.append((output_dir, split, index, items[start:start + shard_size]))
+
+    manifest = {
+        "image_size": inference.IMAGE_SIZE,
+        "channels": 1,
+        "class_names": class_names,
+        "splits": {},
+    }
+    start = time.perf_counter()
+    done = 0
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for (_, split, _, items), shard in zip(jobs, pool.map(write_shard, jobs)):
+            entry = manifest["splits"].setdefault(split, {"count": 0, "shards": [], "skipped": []})
+            entry["count"] += shard["count"]
+            entry["skipped"].extend(shard.pop("skipped"))
+            entry["shards"].append(shard)
+            done += len(items)
+            rate = done / (time.perf_counter() - start)
+            print(f"{split} shard {len(entry['shards']):>4}: {done} images ({rate:.0f} img/s)")
+
+    with open(os.path.join(output_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    return manifest
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert an X-ray folder tree into .npy shards")
+    parser.add_argument("--data-root", required=True, help="Directory containing train/val/test")
+    parser.add_argument("--output", required=True, help="Directory for shards and manifest.json")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE, help="Images per shard")
+    parser.add_argument("--workers", type=int, help="Decoder processes (default: all cores)")
+    args = parser.parse_args()
+
+    manifest = convert(args.data_root, args.output, args.shard_size, args.workers)
+    for split, entry in manifest["splits"].items():
+        print(f"{split}: {entry['count']} images in {len(entry['shards'])} shards, "
+              f"{len(entry['skipped'])} skipped")
+
+if __name__ == "__main__":
+    main()
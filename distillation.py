@@ -0,0 +1,120 @@
+"""Knowledge distillation of the fine-tuned ResNet50 into a compact student
+
+The student takes the same (N, 224, 224, 1) grayscale input in [0, 255] as
+the teacher, so the saved ``.keras`` file is a drop-in replacement for
+``chest_xray_model_fixed.keras`` in app.py and server.py with the keras
+backend.
+
+The loss mixes the hard labels with the teacher's temperature-softened
+probability (Hinton et al.): for a single sigmoid output the soft target is
+``sigmoid(teacher_logit / T)``, matched by ``sigmoid(student_logit / T)``
+with binary cross-entropy scaled by ``T**2``. ``alpha`` weights the hard-
+label term. The teacher runs in inference mode on the same augmented batch
+the student trains on.
+"""
+
+import tensorflow as tf
+from tensorflow.keras import layers
+
+from model_layers import GrayscaleToResNetInput, GrayscaleToRGB
+
+# Both scale [0, 255] RGB input in-graph; the backbone ends in a spatial map
+# so gradcam.py works on students too
+STUDENTS = {
+    "mobilenet_v3_small": lambda shape: tf.keras.applications.MobileNetV3Small(
+        input_shape=shape, include_top=False, weights="imagenet"
+    ),
+    "efficientnet_b0": lambda shape: tf.keras.applications.EfficientNetB0(
+        input_shape=shape, include_top=False, weights="imagenet"
+    ),
+}
+
+def build_student(name, image_size):
+    """(model, logits_model) for a student backbone; call under the strategy scope
+
+    ``logits_model`` shares every weight with ``model`` and stops before the
+    sigmoid, so the distillation loss never has to invert a saturated
+    probability.
+    """
+    backbone = STUDENTS[name]((image_size, image_size, 3))
+    inputs = tf.keras.Input(shape=(image_size, image_size, 1))
+    x = GrayscaleToRGB(name="grayscale_to_rgb")(inputs)
+    x = backbone(x)
+    x = layers.GlobalAveragePooling2D()(x)
+    x = layers.Dropout(0.2)(x)
+    logits = layers.Dense(1, name="logits")(x)
+    outputs = layers.Activation("sigmoid", dtype="float32", name="probability")(logits)
+    return tf.keras.Model(inputs, outputs, name=f"student_{name}"), tf.keras.Model(inputs, logits)
+
+def load_teacher(path):
+    """Frozen teacher taking grayscale input, whatever input format it was saved with"""
+    teacher = tf.keras.models.load_model(path, compile=False)
+    teacher_input = teacher.inputs[0]
+    if teacher_input.shape[-1] == 3:
+        # Original models expect preprocessed 3-channel input
+        inputs = tf.keras.Input(shape=(*teacher_input.shape[1:3], 1))
+        teacher = tf.keras.Model(inputs, teacher(GrayscaleToResNetInput()(inputs)))
+    teacher.trainable = False
+    return teacher
+
+def probability_to_logit(probs, epsilon=1e-6):
+    """Inverse sigmoid, clipped; the teacher's head only exposes probabilities"""
+    probs = tf.clip_by_value(tf.cast(probs, tf.float32), epsilon, 1 - epsilon)
+    return tf.math.log(probs) - tf.math.log1p(-probs)
+
+class Distiller(tf.keras.Model):
+    """Trains ``student`` against labels and ``teacher``; evaluates the student alone
+
+    Reported ``loss`` is the combined loss in training and the hard-label
+    cross-entropy in evaluation, so ``val_loss`` is comparable with the
+    normal training run's.
+    """
+
+    def __init__(self, student, logits_model, teacher, temperature=4.0, alpha=0.3):
+        super().__init__()
+        self.student = student
+        self.logits_model = logits_model
+        self.teacher = teacher
+        self.temperature = temperature
+        self.alpha = alpha
+        self.loss_tracker = tf.keras.metrics.Mean(name="loss")
+        self.soft_loss_tracker = tf.keras.metrics.Mean(name="soft_loss")
+        self.accuracy = tf.keras.metrics.BinaryAccuracy(name="accuracy")
+
+    @property
+    def metrics(self):
+        return [self.loss_tracker, self.soft_loss_tracker, self.accuracy]
+
+    def call(self, inputs, training=False):
+        return self.student(inputs, training=training)
+
+    def train_step(self, data):
+        images, labels = data
+        labels = tf.reshape(tf.cast(labels, tf.float32), (-1, 1))
+        teacher_input = tf.cast(images, self.teacher.inputs[0].dtype)
+        soft_targets = tf.sigmoid(
+            probability_to_logit(self.teacher(teacher_input, training=False)) / self.temperature
+        )
+        with tf.GradientTape() as tape:
+            logits = tf.cast(self.logits_model(images, training=True), tf.float32)
+            hard = tf.nn.sigmoid_cross_entropy_with_logits(labels=labels, logits=logits)
+            soft = tf.nn.sigmoid_cross_entropy_with_logits(
+                labels=soft_targets, logits=logits / self.temperature
+            ) * self.temperature ** 2
+            per_example = tf.reshape(self.alpha * hard + (1 - self.alpha) * soft, (-1,))
+            # Scaled by the global batch so gradients sum correctly across replicas
+            loss = tf.nn.compute_average_loss(per_example)
+        variables = self.logits_model.trainable_variables
+        self.optimizer.apply_gradients(zip(tape.gradient(loss, variables), variables))
+        self.loss_tracker.update_state(per_example)
+        self.soft_loss_tracker.update_state(soft)
+        self.accuracy.update_state(labels, tf.sigmoid(logits))
+        return {metric.name: metric.result() for metric in self.metrics}
+
+    def test_step(self, data):
+        images, labels = data
+        labels = tf.reshape(tf.cast(labels, tf.float32), (-1, 1))
+        logits = tf.cast(self.logits_model(images, training=False), tf.float32)
+        self.loss_tracker.update_state(tf.nn.sigmoid_cross_entropy_with_logits(labels=labels, logits=logits))
+        self.accuracy.update_state(labels, tf.sigmoid(logits))
+        return {"loss": self.loss_tracker.result(), "accuracy": self.accuracy.result()}
@@ -0,0 +1,166 @@
+"""Export the trained Keras model to deployment formats
+
+Single-channel uint8 input with preprocessing folded into the first convolution
+(the other formats can then be exported from the result with --model):
+
+    python export_model.py grayscale --output chest_xray_model_uint8.keras
+
+SavedModel and ONNX, served by the ``savedmodel`` and ``onnx`` backends:
+
+    python export_model.py savedmodel --output chest_xray_savedmodel
+    python export_model.py onnx --output chest_xray_model.onnx
+
+TensorFlow Lite, float or post-training quantized:
+
+    python export_model.py tflite --quantization dynamic --output chest_xray_model_dynamic.tflite
+    python export_model.py tflite --quantization int8 --data-dir chest_xray/train \\
+        --output chest_xray_model_int8.tflite
+
+``dynamic`` stores weights as int8 and keeps float activations. ``int8``
+quantizes weights and activations; activation ranges are calibrated on a
+random sample of the training directory, preprocessed exactly as the app does.
+"""
+
+import argparse
+import random
+
+import numpy as np
+import tensorflow as tf
+
+import inference
+from model_layers import fold_grayscale_input
+
+CALIBRATION_SAMPLES = 200
+ONNX_OPSET = 17
+
+def input_signature(model):
+    """Fixed (None, 224, 224, C) signature matching the model's input"""
+    model_input = model.inputs[0]
+    return tf.TensorSpec((None,) + tuple(model_input.shape[1:]), model_input.dtype, name="input")
+
+def model_input_batch(model, gray_batch):
+    """Grayscale uint8 batch in the input format the model expects"""
+    if model.inputs[0].shape[-1] == 1:
+        return gray_batch.astype(tf.as_dtype(model.inputs[0].dtype).as_numpy_dtype)
+    return inference.to_resnet_input(gray_batch)
+
+# ============================================================
+# GRAYSCALE
+# ============================================================
+
+def export_grayscale(model, output_path, check_samples=8, tolerance=1e-3):
+    """Fold preprocessing into the graph, check parity with the source model and save"""
+    folded = fold_grayscale_input(model, inference.IMAGE_SIZE)
+    gray = np.random.default_rng(0).integers(
+        0, 256, (check_samples, inference.IMAGE_SIZE, inference.IMAGE_SIZE, 1), dtype=np.uint8
+    )
+    expected = model(model_input_batch(model, gray), training=False).numpy()
+    actual = folded(gray, training=False).numpy()
+    max_diff = float(np.max(np.abs(expected - actual)))
+    if max_diff > tolerance:
+        raise ValueError(f"Folded model differs from the source by {max_diff:.2e}")
+    folded.save(output_path)
+    return max_diff
+
+# ============================================================
+# SAVEDMODEL / ONNX
+# ============================================================
+
+def export_savedmodel(model, output_path):
+    """Write a SavedModel whose serving_default signature returns the probability"""
+
+    @tf.function(input_signature=[input_signature(model)])
+    def serve(batch):
+        return {"probability": model(batch, training=False)}
+
+    tf.saved_model.save(model, output_path, signatures={"serving_default": serve})
+
+def export_onnx(model, output_path, opset=ONNX_OPSET):
+    """Convert the Keras model to ONNX with tf2onnx"""
+    try:
+        import tf2onnx
+    except ImportError as e:
+        raise ImportError("ONNX export needs `pip install tf2onnx`") from e
+    tf2onnx.convert.from_keras(
+        model, input_signature=(input_signature(model),), opset=opset, output_path=output_path
+    )
+
+# ============================================================
+# TFLITE
+# ============================================================
+
+def representative_dataset(model, data_dir, samples=CALIBRATION_SAMPLES, seed=0):
+    """Generator of single preprocessed training images for int8 calibration"""
+    items = inference.list_images(data_dir)
+    random.Random(seed).shuffle(items)
+
+    def generate():
+        for path, _ in items[:samples]:
+            array, _ = inference.decode_image(path)
+            if array is not None:
+                yield [model_input_batch(model, np.expand_dims(array, axis=0))]
+
+    return generate
+
+def export_tflite(model, output_path, quantization="none", data_dir=None,
+                  samples=CALIBRATION_SAMPLES):
+    """Convert a Keras model to a .tflite file with optional quantization"""
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    if quantization in ("dynamic", "int8"):
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == "int8":
+        if data_dir is None:
+            raise ValueError("int8 quantization needs --data-dir for calibration")
+        converter.representative_dataset = representative_dataset(model, data_dir, samples)
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        if model.inputs[0].dtype == tf.float32:
+            converter.inference_input_type = tf.int8
+        converter.inference_output_type = tf.int8
+    tflite_model = converter.convert()
+    with open(output_path, "wb") as f:
+        f.write(tflite_model)
+    return len(tflite_model)
+
+# ============================================================
+# ENTRY POINT
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the pneumonia model")
+    parser.add_argument("--model", default=inference.MODEL_PATH, help="Source .keras model")
+    subparsers = parser.add_subparsers(dest="format", required=True)
+
+    grayscale = subparsers.add_parser("grayscale", help="(N, 224, 224, 1) uint8 input .keras model")
+    grayscale.add_argument("--output", required=True)
+
+    savedmodel = subparsers.add_parser("savedmodel", help="TensorFlow SavedModel directory")
+    savedmodel.add_argument("--output", required=True)
+
+    onnx = subparsers.add_parser("onnx", help="ONNX graph for onnxruntime")
+    onnx.add_argument("--output", required=True)
+    onnx.add_argument("--opset", type=int, default=ONNX_OPSET)
+
+    tflite = subparsers.add_parser("tflite", help="TensorFlow Lite flatbuffer")
+    tflite.add_argument("--output", required=True)
+    tflite.add_argument("--quantization", choices=["none", "dynamic", "int8"], default="none")
+    tflite.add_argument("--data-dir", help="Training split directory used to calibrate int8")
+    tflite.add_argument("--samples", type=int, default=CALIBRATION_SAMPLES)
+
+    args = parser.parse_args()
+    model = tf.keras.models.load_model(args.model, compile=False)
+
+    if args.format == "grayscale":
+        max_diff = export_grayscale(model, args.output)
+        print(f"Wrote {args.output} (max |diff| vs source model: {max_diff:.2e})")
+    elif args.format == "savedmodel":
+        export_savedmodel(model, args.output)
+        print(f"Wrote {args.output}")
+    elif args.format == "onnx":
+        export_onnx(model, args.output, args.opset)
+        print(f"Wrote {args.output}")
+    elif args.format == "tflite":
+        size = export_tflite(model, args.output, args.quantization, args.data_dir, args.samples)
+        print(f"Wrote {args.output} ({size / 1e6:.1f} MB, quantization={args.quantization})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Precomputed frozen-backbone features for training the classification head
+
+While the ResNet50 base is frozen (Phase 1), every epoch would otherwise
+repeat the same backbone forward pass over every image. The store runs the
+backbone once and writes the pooled 2048-d features to a raw float32 file
+that is memory-mapped for training, with the labels next to it.
+
+Layout of a store directory:
+    features.f32   float32, shape (count, dim), row-major
+    labels.npy     float32, shape (count,)
+    manifest.json  {"count", "dim", "copies", "key"}
+
+With ``copies > 1`` the first copy of each image is un-augmented and the
+rest pass through the augmentation pipeline first, so the head still sees
+augmented views without running the backbone per epoch.
+"""
+
+import json
+import os
+
+import numpy as np
+
+def _manifest_path(store_dir):
+    return os.path.join(store_dir, "manifest.json")
+
+def build_feature_store(feature_model, dataset, store_dir, copies=1, augment=None, key=None,
+                        count=None):
+    """Run feature_model over a batched (images, labels) dataset and write a store
+
+    ``key`` identifies what was encoded (e.g. data directory, image size,
+    dtype policy and a fingerprint of the files and labels); ``count`` is the
+    number of images in ``dataset``, when known. An existing store with the
+    same key and copy count, holding ``count * copies`` vectors, is reused as
+    is.
+    """
+    manifest_path = _manifest_path(store_dir)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if (manifest.get("key") == key and manifest.get("copies") == copies
+                and (count is None or manifest.get("count") == count * copies)):
+            return load_feature_store(store_dir)
+
+    # The manifest marks a complete store: remove it before touching the data
+    # and write it last, so an interrupted build is never reused
+    os.makedirs(store_dir, exist_ok=True)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    features_path = os.path.join(store_dir, "features.f32")
+    labels = []
+    count = 0
+    dim = None
+    with open(features_path + ".tmp", "wb") as f:
+        for copy in range(copies):
+            for images, batch_labels in dataset:
+                if copy > 0 and augment is not None:
+                    images = augment(images, training=True)
+                features = feature_model(images, training=False).numpy().astype(np.float32)
+                dim = features.shape[1]
+                f.write(features.tobytes())
+                labels.append(np.asarray(batch_labels, dtype=np.float32).reshape(-1))
+                count += len(features)
+    os.replace(features_path + ".tmp", features_path)
+
+    labels_path = os.path.join(store_dir, "labels.npy")
+    with open(labels_path + ".tmp", "wb") as f:
+        np.save(f, np.concatenate(labels))
+    os.replace(labels_path + ".tmp", labels_path)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump({"count": count, "dim": dim, "copies": copies, "key": key}, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return load_feature_store(store_dir)
+
+def load_feature_store(store_dir):
+    """(features memmap, labels) for a store written by build_feature_store"""
+    with open(_manifest_path(store_dir)) as f:
+        manifest = json.load(f)
+    features = np.memmap(
+        os.path.join(store_dir, "features.f32"), dtype=np.float32, mode="r",
+        shape=(manifest["count"], manifest["dim"]),
+    )
+    labels = np.load(os.path.join(store_dir, "labels.npy"))
+    return features, labels
@@ -0,0 +1,111 @@
+"""Grad-CAM heatmaps computed in the same forward pass as the prediction
+
+The saved model is a chain: grayscale input -> in-graph preprocessing ->
+ResNet50 (last conv block, 7x7x2048) -> pooling -> dense head -> sigmoid.
+``GradCAM`` runs the backbone once, records the head under a GradientTape
+and differentiates the probability with respect to the last conv block
+only. The backward pass covers the pooling and the two dense layers, not
+ResNet50, so a heatmap costs little more than the prediction itself.
+
+Only the keras backend has gradients; the exported runtimes cannot explain.
+"""
+
+import io
+
+import numpy as np
+from PIL import Image
+
+from inference import IMAGE_SIZE, to_resnet_input
+
+class GradCAM:
+    """Probability and class-activation map for each image of a grayscale batch
+
+    Wraps a loaded ``backends.KerasBackend``; ``explain_batch`` takes the
+    same uint8 ``(N, 224, 224, 1)`` batches as ``predict_batch``.
+    """
+
+    def __init__(self, backend):
+        import tensorflow as tf
+
+        model = getattr(backend, "model", None)
+        if model is None:
+            raise ValueError("Grad-CAM needs the keras backend")
+        self.tf = tf
+        self.backend = backend
+        # model.layers of the single-path training architecture, in call order
+        layers = [layer for layer in model.layers if not isinstance(layer, tf.keras.layers.InputLayer)]
+        # Split after the last layer that still produces a spatial feature map
+        split = max(i for i, layer in enumerate(layers) if len(layer.output.shape) == 4)
+        self.feature_layers = layers[:split + 1]
+        self.head_layers = layers[split + 1:]
+        self.feature_layer_name = layers[split].name
+        model_input = model.inputs[0]
+        self._explain = tf.function(
+            self._forward,
+            input_signature=[tf.TensorSpec(
+                (None, IMAGE_SIZE, IMAGE_SIZE, backend.input_channels), model_input.dtype
+            )],
+        )
+
+    def _forward(self, batch):
+        tf = self.tf
+        features = batch
+        for layer in self.feature_layers:
+            features = layer(features, training=False)
+        with tf.GradientTape() as tape:
+            tape.watch(features)
+            output = features
+            for layer in self.head_layers:
+                output = layer(output, training=False)
+            probs = tf.cast(output[:, 0], tf.float32)
+        # Differentiate with respect to the watched tensor, then cast (a cast
+        # before this point would be a new tensor the tape never recorded)
+        grads = tf.cast(tape.gradient(probs, features), tf.float32)
+        features = tf.cast(features, tf.float32)
+        weights = tf.reduce_mean(grads, axis=(1, 2), keepdims=True)  # Per-channel importance
+        cams = tf.nn.relu(tf.reduce_sum(weights * features, axis=-1))
+        cams = cams / (tf.reduce_max(cams, axis=(1, 2), keepdims=True) + 1e-8)
+        return probs, cams
+
+    def explain_batch(self, batch):
+        """(probabilities (N,), heatmaps (N, h, w) in [0, 1]) for one grayscale batch"""
+        if self.backend.input_channels == 1:
+            model_input = np.asarray(batch, dtype=self.backend.input_dtype)
+        else:
+            model_input = to_resnet_input(batch)
+        probs, cams = self._explain(self.tf.convert_to_tensor(model_input))
+        return probs.numpy(), cams.numpy()
+
+    def warmup(self, batch_sizes=(1,)):
+        for batch_size in batch_sizes:
+            self.explain_batch(np.zeros((batch_size, IMAGE_SIZE, IMAGE_SIZE, 1), dtype=np.uint8))
+
+# ============================================================
+# RENDERING
+# ============================================================
+
+def colorize(heatmap):
+    """(h, w) values in [0, 1] -> (h, w, 3) uint8 jet colours"""
+    x = np.clip(heatmap, 0.0, 1.0)[..., np.newaxis]
+    rgb = np.clip(1.5 - np.abs(4 * x - np.array([3.0, 2.0, 1.0])), 0.0, 1.0)
+    return (rgb * 255).astype(np.uint8)
+
+def overlay(image, heatmap, alpha=0.45):
+    """Blend a heatmap over a PIL image (any size; the map covers the whole image)"""
+    base = image.convert("RGB")
+    smooth = Image.fromarray((np.clip(heatmap, 0.0, 1.0) * 255).astype(np.uint8), "L")
+    smooth = np.asarray(smooth.resize(base.size, Image.BICUBIC), dtype=np.float32) / 255
+    colours = colorize(smooth).astype(np.float32)
+    # Weight the colour by activation so cold regions keep the original X-ray
+    weight = alpha * smooth[..., np.newaxis]
+    blended = np.asarray(base, dtype=np.float32) * (1 - weight) + colours * weight
+    return Image.fromarray(blended.astype(np.uint8), "RGB")
+
+def heatmap_to_bytes(heatmap):
+    """Compact serialization for the prediction cache (float16 .npy)"""
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(heatmap, dtype=np.float16))
+    return buffer.getvalue()
+
+def heatmap_from_bytes(data):
+    return np.load(io.BytesIO(data)).astype(np.float32)
@@ -0,0 +1,200 @@
+"""Model loading, preprocessing and batched prediction shared by the app and the server"""
+
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from metrics import MODEL_LOAD_SECONDS, STAGE_SECONDS
+
+# ============================================================
+# CONFIGURATION
+# ============================================================
+
+IMAGE_SIZE = 224
+MODEL_PATH = "chest_xray_model_fixed.keras"
+BATCH_SIZE = 16  # Fixed batch shape (one predict call per batch)
+DECODE_WORKERS = 8  # Threads used to decode images in parallel
+CLASS_NAMES = ["NORMAL", "PNEUMONIA"]  # Label order used by image_dataset_from_directory
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+IMAGENET_MEAN_BGR = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+# Reduced-resolution decode: JPEG DCT scaling (1/2, 1/4, 1/8) plus an integer
+# box reduction before the final resize. benchmarks/fast_decode.py checks
+# predictions stay within tolerance of the full-resolution path.
+FAST_DECODE = True
+REDUCING_GAP = 3.0  # Box-reduce until the image is at most this many times the target size
+
+# ============================================================
+# LOAD MODEL
+# ============================================================
+
+def load_model(model_path=MODEL_PATH, backend="keras", precision="float32"):
+    """Load the trained pneumonia detection model with the chosen runtime, warmed up"""
+    import backends  # Deferred: backends imports this module's constants
+
+    start = time.perf_counter()
+    model = backends.load_backend(model_path, backend, precision)
+    model.warmup()
+    MODEL_LOAD_SECONDS.set(time.perf_counter() - start)
+    return model
+
+class BackgroundLoader:
+    """Runs a model-loading function once on a daemon thread
+
+    ``state`` is "loading", "ready" or "failed". ``wait()`` blocks until the
+    load finishes and returns the model (None on failure, with ``error``
+    holding the exception), so callers that arrive early only wait for the
+    remainder.
+    """
+
+    def __init__(self, load_fn):
+        self.model = None
+        self.error = None
+        self.load_seconds = None
+        self._done = threading.Event()
+        threading.Thread(target=self._load, args=(load_fn,), name="model-preload", daemon=True).start()
+
+    def _load(self, load_fn):
+        start = time.perf_counter()
+        try:
+            self.model = load_fn()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.load_seconds = time.perf_counter() - start
+            self._done.set()
+
+    @property
+    def state(self):
+        if not self._done.is_set():
+            return "loading"
+        return "failed" if self.error is not None else "ready"
+
+    def wait(self, timeout=None):
+        """The loaded model once ready (None if it failed or timeout expired)"""
+        self._done.wait(timeout)
+        return self.model
+
+# ============================================================
+# PREPROCESS IMAGE
+# ============================================================
+
+def open_image(source, fast=FAST_DECODE):
+    """Open and decode an image file; with fast, JPEGs decode straight to reduced-size grayscale
+
+    ``Image.draft`` makes the JPEG decoder emit the smallest 1/2, 1/4 or 1/8
+    scale that still covers 224x224, so a 3000x2500 X-ray decodes as
+    375x312 instead of 7.5 megapixels. Other formats decode in full.
+    """
+    image = Image.open(source)
+    if fast:
+        image.draft("L", (IMAGE_SIZE, IMAGE_SIZE))
+    image.load()
+    return image
+
+def prepare_image_array(image, fast=FAST_DECODE):
+    """Convert a PIL image to a single (224, 224, 1) uint8 grayscale array
+
+    With fast, a not-yet-loaded JPEG gets the reduced-scale decode of
+    open_image, and the resize first shrinks by an integer factor with a
+    box filter (``reducing_gap``) so the bicubic pass runs on a small image.
+    """
+    if fast:
+        image.draft("L", (IMAGE_SIZE, IMAGE_SIZE))  # No-op once decoded or for non-JPEGs
+    image = image.convert("L")  # Grayscale
+    image = image.resize((IMAGE_SIZE, IMAGE_SIZE), reducing_gap=REDUCING_GAP if fast else None)
+    return np.array(image)[..., np.newaxis]
+
+def to_resnet_input(batch):
+    """(N, 224, 224, 1) grayscale batch -> (N, 224, 224, 3) float32 ResNet50 input
+
+    Only needed for models that take preprocessed RGB; models exported with
+    ``export_model.py grayscale`` do this in-graph.
+    """
+    # Convert grayscale to RGB
+    batch = np.repeat(np.asarray(batch, dtype=np.float32), 3, axis=-1)
+    # ResNet50 preprocessing ("caffe" mode: RGB -> BGR, subtract ImageNet channel means),
+    # done in NumPy so non-TensorFlow backends never import TensorFlow
+    return batch[..., ::-1] - IMAGENET_MEAN_BGR
+
+def list_images(directory):
+    """(path, label) pairs from a class-per-subfolder tree such as chest_xray/test"""
+    items = []
+    for label, class_name in enumerate(CLASS_NAMES):
+        class_dir = os.path.join(directory, class_name)
+        for name in sorted(os.listdir(class_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                items.append((os.path.join(class_dir, name), label))
+    return items
+
+def read_source(source):
+    """Raw bytes of an upload, an open binary file or a bytes object"""
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "getvalue"):
+        return source.getvalue()
+    return source.read()
+
+def decode_image(source):
+    """Decode a path, file-like object or raw bytes; returns (array, None) or (None, error message)"""
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        with STAGE_SECONDS.labels(stage="decode").time():
+            image = open_image(source)
+        with STAGE_SECONDS.labels(stage="preprocess").time():
+            return prepare_image_array(image), None
+    except Exception as e:
+        return None, str(e)
+
+def decode_images(sources, workers=DECODE_WORKERS):
+    """Decode and preprocess images in parallel (PIL releases the GIL while decoding)"""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(decode_image, sources))
+
+# ============================================================
+# PREDICT
+# ============================================================
+
+def predict_batch(model, batch):
+    """Pneumonia probabilities for one stacked (N, 224, 224, 1) grayscale batch"""
+    with STAGE_SECONDS.labels(stage="forward").time():
+        return model.predict_batch(batch)
+
+def predict_in_batches(model, arrays, batch_size=BATCH_SIZE, on_progress=None):
+    """Run the model over a list of arrays with one predict call per fixed-size batch"""
+    probs = []
+    for start in range(0, len(arrays), batch_size):
+        chunk = arrays[start:start + batch_size]
+        batch = np.zeros((batch_size,) + chunk[0].shape, dtype=chunk[0].dtype)
+        batch[:len(chunk)] = chunk  # Pad the last batch so every call sees the same shape
+        probs.extend(float(p) for p in predict_batch(model, batch)[:len(chunk)])
+        if on_progress is not None:
+            on_progress(len(probs) / len(arrays))
+    return probs
+
+def predict_sources(model, sources, batch_size=BATCH_SIZE, on_progress=None, cache=None):
+    """Decode and score images; returns one (probability, error) pair per source
+
+    With a PredictionCache, images seen before are answered without decoding
+    and only the misses reach the model.
+    """
+    if cache is None:
+        decoded = decode_images(sources)
+        arrays = [array for array, _ in decoded if array is not None]
+        probs = iter(predict_in_batches(model, arrays, batch_size, on_progress))
+        return [(next(probs), None) if array is not None else (None, error) for array, error in decoded]
+
+    contents = [read_source(source) for source in sources]
+    results = [(cache.get(content), None) for content in contents]
+    misses = [i for i, (prob, _) in enumerate(results) if prob is None]
+    for i, (prob, error) in zip(misses, predict_sources(model, [contents[i] for i in misses],
+                                                          batch_size, on_progress)):
+        results[i] = (prob, error)
+        if prob is not None:
+            cache.put(contents[i], prob)
+    return results
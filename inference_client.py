@@ -0,0 +1,53 @@
+"""Minimal stdlib client for the PneumoDetect inference server (server.py)"""
+
+import json
+import uuid
+import urllib.request
+
+TIMEOUT_SECONDS = 120
+
+def is_healthy(base_url):
+    """True if the server answers /health"""
+    try:
+        with urllib.request.urlopen(base_url.rstrip("/") + "/health", timeout=5) as response:
+            return response.status == 200
+    except OSError:
+        return False
+
+def _quote_filename(filename):
+    """filename as a quoted-string parameter value (RFC 7578 section 4.2)
+
+    Backslashes and double quotes are backslash-escaped, which server.py's
+    parser undoes; CR and LF cannot appear in a header at all, so they are
+    percent-encoded as browsers do.
+    """
+    escaped = filename.replace("\\", "\\\\").replace('"', '\\"')
+    return '"' + escaped.replace("\r", "%0D").replace("\n", "%0A") + '"'
+
+def encode_multipart(files):
+    """Build a multipart/form-data body from (filename, bytes) pairs"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for filename, data in files:
+        parts.append(
+            f"--{boundary}\r\n"
+            f'Content-Disposition: form-data; name="files"; filename={_quote_filename(filename)}\r\n'
+            f"Content-Type: application/octet-stream\r\n\r\n".encode("utf-8")
+        )
+        parts.append(data)
+        parts.append(b"\r\n")
+    parts.append(f"--{boundary}--\r\n".encode("utf-8"))
+    return f"multipart/form-data; boundary={boundary}", b"".join(parts)
+
+def predict_files(base_url, files):
+    """Score (filename, bytes) pairs; returns one (probability, error) pair per file"""
+    content_type, body = encode_multipart(files)
+    request = urllib.request.Request(
+        base_url.rstrip("/") + "/predict",
+        data=body,
+        headers={"Content-Type": content_type},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=TIMEOUT_SECONDS) as response:
+        predictions = json.load(response)["predictions"]
+    return [(item["probability"], item["error"]) for item in predictions]
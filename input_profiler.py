@@ -0,0 +1,120 @@
+"""Stage-by-stage throughput of a tf.data training pipeline against model compute
+
+``profile_pipeline`` takes the pipeline as cumulative prefixes (source, then
+source + stage 1, ...) and iterates each with no model attached, once on the
+default thread pool and once on a single-thread pool. The difference in
+per-image time between consecutive prefixes is the cost of that stage; the
+single-thread rate gives how many cores it needs to keep up with the model.
+The model's own rate is measured on one batch held in memory, and the
+real training loop's wait on the iterator with both together.
+"""
+
+import math
+import time
+
+import tensorflow as tf
+
+def images_per_sec(dataset, batches, threads=None, warmup=2):
+    """Images/sec pulling ``batches`` batches (after ``warmup``) from a fresh iterator"""
+    if threads is not None:
+        options = tf.data.Options()
+        options.threading.private_threadpool_size = threads
+        dataset = dataset.with_options(options)
+    iterator = iter(dataset)
+    for _ in range(warmup):
+        next(iterator)
+    images = 0
+    start = time.perf_counter()
+    for _ in range(batches):
+        try:
+            batch_images, _ = next(iterator)
+        except StopIteration:
+            break
+        images += int(batch_images.shape[0])
+    return images / (time.perf_counter() - start)
+
+def full_pass(dataset):
+    """(seconds, images) for one complete iteration, e.g. to fill a cache"""
+    images = 0
+    start = time.perf_counter()
+    for batch_images, _ in dataset:
+        images += int(batch_images.shape[0])
+    return time.perf_counter() - start, images
+
+def compute_images_per_sec(train_step, batch, steps, warmup=3):
+    """Model-only rate: train_step on one in-memory batch, no input pipeline"""
+    for _ in range(warmup):
+        train_step(*batch)
+    start = time.perf_counter()
+    for _ in range(steps):
+        train_step(*batch)
+    return steps * int(batch[0].shape[0]) / (time.perf_counter() - start)
+
+def training_loop_wait(train_step, dataset, steps, warmup=3):
+    """Fraction of training-loop time spent blocked on next() with the real pipeline"""
+    iterator = iter(dataset)
+    for _ in range(warmup):
+        train_step(*next(iterator))
+    wait = 0.0
+    start = time.perf_counter()
+    for _ in range(steps):
+        fetch_start = time.perf_counter()
+        batch = next(iterator)
+        wait += time.perf_counter() - fetch_start
+        train_step(*batch)
+    total = time.perf_counter() - start
+    return {"wait_s": wait, "total_s": total, "wait_fraction": wait / total}
+
+def profile_pipeline(stages, batches=50):
+    """Throughput of each cumulative prefix
+
+    ``stages`` is [(name, dataset)] in pipeline order, each dataset being the
+    previous one plus that stage. Returns one dict per stage with
+    ``images_per_sec``, ``single_thread_images_per_sec`` and ``stage_ms``
+    (added per-image cost, single thread).
+    """
+    results = []
+    previous_ms = 0.0
+    for name, dataset in stages:
+        rate = images_per_sec(dataset, batches)
+        single = images_per_sec(dataset, batches, threads=1)
+        per_image_ms = 1000 / single
+        results.append({
+            "stage": name,
+            "images_per_sec": rate,
+            "single_thread_images_per_sec": single,
+            "stage_ms": max(0.0, per_image_ms - previous_ms),
+        })
+        previous_ms = per_image_ms
+    return results
+
+def suggest(stages, compute_ips, loop_wait, cache_fill=None):
+    """Plain-text verdict: input- or compute-bound, and which stage to work on"""
+    full = stages[-1]
+    lines = [
+        f"Model compute: {compute_ips:.1f} img/s; full input pipeline: {full['images_per_sec']:.1f} img/s; "
+        f"training loop waited {100 * loop_wait['wait_fraction']:.1f}% of the time on input."
+    ]
+    cores = math.ceil(compute_ips / full["single_thread_images_per_sec"])
+    if full["images_per_sec"] >= 1.2 * compute_ips and loop_wait["wait_fraction"] < 0.05:
+        lines.append(f"Compute-bound: the pipeline keeps up. About {cores} core(s) for data loading are enough; "
+                     "the rest can go to the model.")
+    else:
+        worst = max(stages, key=lambda s: s["stage_ms"])
+        lines.append(f"Input-bound. Most expensive stage: '{worst['stage']}' "
+                     f"({worst['stage_ms']:.2f} ms/image on one core).")
+        lines.append(f"Keeping up with the model needs about {cores} core(s) for the pipeline; "
+                     "give the parallel map stages more cores, or move the costly stage before the cache "
+                     "if it does not need to change per epoch.")
+    if cache_fill is not None:
+        fill_ips = cache_fill["images"] / cache_fill["seconds"]
+        if fill_ips < compute_ips:
+            lines.append(f"The first epoch decodes at {fill_ips:.1f} img/s (slower than the model): "
+                         "convert the images once with convert_dataset.py and train with --shards-dir.")
+    return "\n".join(lines)
+
+def print_stages(stages):
+    print(f"{'stage':<22}{'img/s':>10}{'1-thread img/s':>16}{'stage ms/img':>14}")
+    for s in stages:
+        print(f"{s['stage']:<22}{s['images_per_sec']:>10.1f}"
+              f"{s['single_thread_images_per_sec']:>16.1f}{s['stage_ms']:>14.2f}")
@@ -0,0 +1,108 @@
+"""Launch data-parallel training workers with TF_CONFIG set for MultiWorkerMirroredStrategy
+
+Several worker processes on one machine (cores are split evenly between them):
+
+    python launch_workers.py --num-workers 4 -- python chest_xray_modified.py
+
+Across hosts, pass the full cluster on every host and start that host's
+slice of it, e.g. two hosts with two workers each:
+
+    host-a$ python launch_workers.py --cluster a:2222,a:2223,b:2222,b:2223 \\
+                --num-workers 2 --first-index 0 -- python chest_xray_modified.py
+    host-b$ python launch_workers.py --cluster a:2222,a:2223,b:2222,b:2223 \\
+                --num-workers 2 --first-index 2 -- python chest_xray_modified.py
+
+Worker 0 is the chief; it writes the model and logs.
+"""
+
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+POLL_SECONDS = 0.5
+
+def free_ports(count):
+    """Ask the OS for unused localhost ports"""
+    sockets = [socket.socket() for _ in range(count)]
+    try:
+        for s in sockets:
+            s.bind(("localhost", 0))
+        return [s.getsockname()[1] for s in sockets]
+    finally:
+        for s in sockets:
+            s.close()
+
+def worker_env(cluster, index, threads):
+    """Environment for one worker: TF_CONFIG plus a share of the host's cores"""
+    env = dict(os.environ)
+    env["TF_CONFIG"] = json.dumps({
+        "cluster": {"worker": cluster},
+        "task": {"type": "worker", "index": index},
+    })
+    env["TF_NUM_INTRAOP_THREADS"] = str(threads)
+    env["TF_NUM_INTEROP_THREADS"] = "2"
+    env["OMP_NUM_THREADS"] = str(threads)
+    return env
+
+def stop(processes, grace_seconds=10):
+    """Terminate the processes still running, killing any that outlast grace_seconds"""
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    deadline = time.monotonic() + grace_seconds
+    for process in processes:
+        try:
+            process.wait(max(0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+def launch(command, num_workers, cluster=None, first_index=0):
+    """Start num_workers processes running command
+
+    Returns 0 once they all succeed, or the exit code of the first one to
+    fail. A failed worker's peers would block forever in collective ops, so
+    they are stopped as soon as it exits.
+    """
+    if cluster is None:
+        cluster = [f"localhost:{port}" for port in free_ports(num_workers)]
+    threads = max(1, (os.cpu_count() or 1) // num_workers)
+    processes = [
+        subprocess.Popen(command, env=worker_env(cluster, index, threads))
+        for index in range(first_index, first_index + num_workers)
+    ]
+    try:
+        while True:
+            codes = [process.poll() for process in processes]
+            failed = [code for code in codes if code not in (None, 0)]
+            if failed:
+                print(f"A worker exited with code {failed[0]}; stopping the others", file=sys.stderr)
+                stop(processes)
+                return failed[0]
+            if all(code == 0 for code in codes):
+                return 0
+            time.sleep(POLL_SECONDS)
+    except KeyboardInterrupt:
+        stop(processes)
+        raise
+
+def main():
+    parser = argparse.ArgumentParser(description="Launch MultiWorkerMirroredStrategy workers")
+    parser.add_argument("--num-workers", type=int, required=True, help="Processes to start here")
+    parser.add_argument("--cluster", help="Comma-separated host:port of every worker (default: local)")
+    parser.add_argument("--first-index", type=int, default=0, help="Cluster index of the first local worker")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="Training command after --")
+    args = parser.parse_args()
+
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    if not command:
+        parser.error("missing training command after --")
+    cluster = args.cluster.split(",") if args.cluster else None
+    sys.exit(launch(command, args.num_workers, cluster, args.first_index))
+
+if __name__ == "__main__":
+    main()
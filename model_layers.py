@@ -0,0 +1,122 @@
+"""Custom Keras layers that move image preprocessing into the model graph
+
+Import this module before ``tf.keras.models.load_model`` on any model that
+contains these layers; registration makes them deserializable.
+"""
+
+import numpy as np
+import tensorflow as tf
+
+# Per-channel means subtracted by ResNet50 "caffe" preprocessing, in BGR order
+IMAGENET_MEAN_BGR = (103.939, 116.779, 123.68)
+
+@tf.keras.utils.register_keras_serializable(package="pneumodetect")
+class GrayscaleToResNetInput(tf.keras.layers.Layer):
+    """(N, H, W, 1) grayscale in [0, 255] -> (N, H, W, 3) ResNet50 input
+
+    Same result as ``grayscale_to_rgb`` followed by ``preprocess_input``:
+    channel copies, RGB -> BGR (a no-op on identical channels) and mean
+    subtraction. Keeping it in the graph makes training and serving
+    preprocessing identical by construction.
+    """
+
+    def call(self, inputs):
+        x = tf.cast(inputs, self.compute_dtype)
+        mean = tf.constant(IMAGENET_MEAN_BGR, dtype=self.compute_dtype)
+        return tf.concat([x, x, x], axis=-1) - mean
+
+@tf.keras.utils.register_keras_serializable(package="pneumodetect")
+class GrayscaleToRGB(tf.keras.layers.Layer):
+    """(N, H, W, 1) grayscale in [0, 255] -> (N, H, W, 3) copies, still in [0, 255]
+
+    For backbones that scale their input in-graph (MobileNetV3,
+    EfficientNet), used by the distilled student models.
+    """
+
+    def call(self, inputs):
+        x = tf.cast(inputs, self.compute_dtype)
+        return tf.concat([x, x, x], axis=-1)
+
+@tf.keras.utils.register_keras_serializable(package="pneumodetect")
+class FoldedGrayscaleStem(tf.keras.layers.Layer):
+    """ResNet50's conv1_pad + conv1_conv folded onto a single-channel uint8 input
+
+    For a grayscale image ``g`` the three preprocessed channels are
+    ``g - mean[c]``, so the first convolution equals a one-channel
+    convolution with the kernel summed over input channels, plus the
+    response of the original stem to an all-zero image. That response is a
+    spatial constant (not a bias) because zero padding is applied after
+    mean subtraction in the original graph.
+    """
+
+    def __init__(self, filters=64, kernel_size=7, strides=2, padding=3, output_size=112, **kwargs):
+        super().__init__(**kwargs)
+        self.filters = filters
+        self.kernel_size = kernel_size
+        self.strides = strides
+        self.padding = padding
+        self.output_size = output_size
+
+    def build(self, input_shape):
+        self.kernel = self.add_weight(
+            name="kernel", shape=(self.kernel_size, self.kernel_size, 1, self.filters),
+            initializer="zeros",
+        )
+        self.offset = self.add_weight(
+            name="offset", shape=(self.output_size, self.output_size, self.filters),
+            initializer="zeros",
+        )
+        super().build(input_shape)
+
+    def call(self, inputs):
+        x = tf.cast(inputs, self.compute_dtype)
+        p = self.padding
+        x = tf.pad(x, [[0, 0], [p, p], [p, p], [0, 0]])
+        x = tf.nn.conv2d(x, tf.cast(self.kernel, self.compute_dtype), self.strides, "VALID")
+        return x + tf.cast(self.offset, self.compute_dtype)
+
+    def get_config(self):
+        config = super().get_config()
+        config.update({
+            "filters": self.filters,
+            "kernel_size": self.kernel_size,
+            "strides": self.strides,
+            "padding": self.padding,
+            "output_size": self.output_size,
+        })
+        return config
+
+def fold_grayscale_input(model, image_size=224):
+    """Rebuild a trained pneumonia model to take (N, 224, 224, 1) uint8 input
+
+    Works for the original 3-channel preprocessed-input models and for models
+    that start with GrayscaleToResNetInput. The ResNet50 stem absorbs channel
+    expansion and mean subtraction; everything after conv1_conv and the
+    classification head are reused unchanged.
+    """
+    base_index, base = next(
+        (i, layer) for i, layer in enumerate(model.layers) if isinstance(layer, tf.keras.Model)
+    )
+    conv1_pad = base.get_layer("conv1_pad")
+    conv1_conv = base.get_layer("conv1_conv")
+    kernel, bias = conv1_conv.get_weights()
+
+    # Response of the original stem to a black image, i.e. preprocessed input of -mean
+    black = np.zeros((1, image_size, image_size, 3), dtype=np.float32) - np.array(
+        IMAGENET_MEAN_BGR, dtype=np.float32
+    )
+    offset = conv1_conv(conv1_pad(black)).numpy()[0]
+
+    stem = FoldedGrayscaleStem(
+        filters=kernel.shape[-1], kernel_size=kernel.shape[0], strides=conv1_conv.strides[0],
+        padding=conv1_pad.padding[0][0], output_size=offset.shape[0], name="folded_stem",
+    )
+    inputs = tf.keras.Input(shape=(image_size, image_size, 1), dtype="uint8")
+    x = stem(inputs)
+    stem.set_weights([kernel.sum(axis=2, keepdims=True), offset])
+
+    tail = tf.keras.Model(conv1_conv.output, base.output, name="resnet50_tail")
+    x = tail(x, training=False)
+    for layer in model.layers[base_index + 1:]:
+        x = layer(x)
+    return tf.keras.Model(inputs, x, name=f"{model.name}_uint8")
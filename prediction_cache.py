@@ -0,0 +1,256 @@
+"""Two-tier prediction cache keyed on image content and model version
+
+Keys are ``sha256(image bytes)`` combined with a fingerprint of the model
+file (or SavedModel directory), the serving backend and the compute
+precision. Replacing ``chest_xray_model_fixed.keras`` invalidates every
+entry automatically, and onnx, int8 tflite or bfloat16 results are never
+served for another numeric path. Lookups hit an in-memory LRU first, then a SQLite file shared
+across processes and restarts. Both tiers are bounded by entry count and
+evict least-recently-used entries first.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import CACHE_LOOKUPS
+
+CACHE_PATH = ".pneumodetect_cache.sqlite3"
+MEMORY_ENTRIES = 4096
+DISK_ENTRIES = 200_000
+EVICT_EVERY = 256  # Trim the disk tier once per this many writes
+
+_fingerprints = {}
+_fingerprint_lock = threading.Lock()
+
+def _model_files(model_path):
+    """(name relative to model_path, path) of every file in the model, in a stable order"""
+    if not os.path.isdir(model_path):
+        return [("", model_path)]
+    files = []
+    for directory, subdirs, names in os.walk(model_path):
+        subdirs.sort()
+        for name in sorted(names):
+            path = os.path.join(directory, name)
+            files.append((os.path.relpath(path, model_path), path))
+    return files
+
+def model_signature(model_path):
+    """Names, sizes and mtimes of the model's files; changes whenever the model is replaced"""
+    signature = []
+    for name, path in _model_files(model_path):
+        stat = os.stat(path)
+        signature.append((name, stat.st_size, stat.st_mtime_ns))
+    return tuple(signature)
+
+def model_version(model_path):
+    """(signature, SHA-256) of the model file, or of a SavedModel directory's file names and contents
+
+    The hash is recomputed only when the signature changes. Take the version
+    before loading the model and pass it to PredictionCache, so predictions
+    are keyed on the file that was actually loaded.
+    """
+    files = [(name, path, os.stat(path)) for name, path in _model_files(model_path)]
+    signature = tuple((name, stat.st_size, stat.st_mtime_ns) for name, _, stat in files)
+    with _fingerprint_lock:
+        cached = _fingerprints.get(model_path)
+        if cached is not None and cached[0] == signature:
+            return cached
+    digest = hashlib.sha256()
+    for name, path, stat in files:
+        if name:  # Directory member: its name and size delimit its bytes in the digest
+            digest.update(f"{name}\0{stat.st_size}\0".encode("utf-8"))
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    version = (signature, digest.hexdigest())
+    with _fingerprint_lock:
+        _fingerprints[model_path] = version
+    return version
+
+def model_fingerprint(model_path):
+    """SHA-256 of the model file, or of a SavedModel directory's file names and contents"""
+    return model_version(model_path)[1]
+
+class PredictionCache:
+    """In-memory LRU over a size-bounded SQLite table of probabilities
+
+    ``version`` is the model_version() of the file the served model was
+    loaded from (taken now when omitted). The cache stays keyed on it for its
+    whole life: if the file is replaced while the process keeps serving the
+    old model, caching stops rather than storing old predictions under the
+    new file's hash.
+    """
+
+    def __init__(self, model_path, db_path=CACHE_PATH,
+                 memory_entries=MEMORY_ENTRIES, disk_entries=DISK_ENTRIES,
+                 backend="keras", precision="float32", version=None):
+        self.model_path = model_path
+        self.backend = backend
+        self.precision = precision
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.model_changed = False
+        self._writes = 0
+        self._memory = OrderedDict()
+        self._heatmaps = OrderedDict()  # Serialized Grad-CAM maps, same keys and bound as _memory
+        self._lock = threading.Lock()
+        self._signature, file_hash = version if version is not None else model_version(model_path)
+        self._fingerprint = f"{file_hash}:{backend}:{precision}"
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, "
+                "probability REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS predictions_last_access ON predictions (last_access)"
+            )
+            columns = {row[1] for row in self._db.execute("PRAGMA table_info(predictions)")}
+            if "heatmap" not in columns:  # Files created before heatmaps were cached
+                self._db.execute("ALTER TABLE predictions ADD COLUMN heatmap BLOB")
+            # Drop every entry made with a different model file. Entries for the same
+            # file under another backend or precision stay (their keys differ), so
+            # processes serving different runtimes can share one cache file. Bare file
+            # hashes are rows written before backend and precision were keyed.
+            self._db.execute(
+                "DELETE FROM predictions WHERE substr(fingerprint, 1, 64) != ? OR fingerprint = ?",
+                (file_hash, file_hash),
+            )
+
+    def _check_model(self):
+        """False once the model file no longer matches the one being served"""
+        if not self.model_changed:
+            try:
+                changed = model_signature(self.model_path) != self._signature
+            except OSError:  # Removed, or caught halfway through being replaced
+                changed = True
+            if changed:
+                self.model_changed = True
+                print(f"Prediction cache disabled: {self.model_path} changed since the model was "
+                      "loaded; restart to serve and cache the new model")
+        return not self.model_changed
+
+    def key(self, content):
+        """Cache key for raw image bytes under the served model"""
+        return hashlib.sha256(content).hexdigest() + ":" + self._fingerprint
+
+    def get(self, content):
+        """Cached probability for raw image bytes, or None"""
+        if not self._check_model():
+            return None
+        key = self.key(content)
+        with self._lock:
+            prob = self._memory.get(key)
+            if prob is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                CACHE_LOOKUPS.labels(result="memory_hit").inc()
+                return prob
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT probability FROM predictions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE predictions SET last_access = ? WHERE key = ?", (time.time(), key)
+                    )
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    CACHE_LOOKUPS.labels(result="disk_hit").inc()
+                    return row[0]
+            self.misses += 1
+            CACHE_LOOKUPS.labels(result="miss").inc()
+            return None
+
+    def get_heatmap(self, content):
+        """Cached serialized heatmap for raw image bytes, or None
+
+        Counted separately from get(): a prediction cached without a heatmap
+        is still a hit there.
+        """
+        if not self._check_model():
+            return None
+        key = self.key(content)
+        with self._lock:
+            heatmap = self._heatmaps.get(key)
+            if heatmap is not None:
+                self._heatmaps.move_to_end(key)
+                return heatmap
+            if self._db is None:
+                return None
+            row = self._db.execute("SELECT heatmap FROM predictions WHERE key = ?", (key,)).fetchone()
+            if row is None or row[0] is None:
+                return None
+            self._remember_heatmap(key, row[0])
+            return row[0]
+
+    def put(self, content, prob, heatmap=None):
+        """Store the probability (and optionally a serialized heatmap) for raw image bytes"""
+        if not self._check_model():
+            return
+        key = self.key(content)
+        with self._lock:
+            self._remember(key, prob)
+            if heatmap is not None:
+                self._remember_heatmap(key, heatmap)
+            if self._db is not None:
+                # Keep a stored heatmap when only the probability is written again
+                self._db.execute(
+                    "INSERT INTO predictions (key, fingerprint, probability, last_access, heatmap) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET "
+                    "probability = excluded.probability, last_access = excluded.last_access, "
+                    "heatmap = COALESCE(excluded.heatmap, heatmap)",
+                    (key, self._fingerprint, prob, time.time(), heatmap),
+                )
+                self._writes += 1
+                if self._writes % EVICT_EVERY == 0:
+                    self._evict_disk()
+
+    def stats(self):
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            disk_size = (
+                self._db.execute("SELECT COUNT(*) FROM predictions").fetchone()[0]
+                if self._db is not None else 0
+            )
+            return {
+                "hits": self.hits,
+                "memory_hits": self.hits - self.disk_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_size,
+                "model_changed": self.model_changed,
+            }
+
+    def _remember(self, key, prob):
+        self._memory[key] = prob
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _remember_heatmap(self, key, heatmap):
+        self._heatmaps[key] = heatmap
+        self._heatmaps.move_to_end(key)
+        while len(self._heatmaps) > self.memory_entries:
+            self._heatmaps.popitem(last=False)
+
+    def _evict_disk(self):
+        self._db.execute(
+            "DELETE FROM predictions WHERE key IN ("
+            "SELECT key FROM predictions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.disk_entries,),
+        )
@@ -0,0 +1,296 @@
+"""Structured filter pruning of the fine-tuned ResNet50, exported as a smaller dense model
+
+    python prune_model.py --data-root chest_xray --sparsities 0.25 0.5 0.75 \\
+        --fine-tune-epochs 2 --report pruning.json
+
+Masking weights leaves every convolution the same size, so it does not make
+CPU inference any faster. Here whole filters are removed instead and the
+network is rebuilt with narrower layers. Only the two inner convolutions of
+each bottleneck block (``_1_conv`` 1x1 and ``_2_conv`` 3x3) are pruned,
+together with their BatchNorms and the matching input channels of the next
+convolution. Block outputs feed the residual additions, so their width is
+shared across a whole stage; it is left alone.
+
+Filters are ranked per layer by one of two criteria:
+
+    l1      L1 norm of each filter, scaled by its BatchNorm's gamma / sqrt(var)
+    taylor  first-order Taylor sensitivity |activation x gradient of the loss|,
+            averaged over --score-batches training batches
+
+Each sparsity keeps the top ``1 - sparsity`` of every pruned layer, rounded
+up to a multiple of 8 channels for the CPU kernels. The pruned model is then
+fine-tuned briefly on the augmented training pipeline from
+chest_xray_modified.py, evaluated and saved as ``<output-prefix>_s<NN>.keras``.
+These files load in the app and server like the original. The table reports
+params, GFLOPs, file size, CPU latency and test accuracy per sparsity, with
+the unpruned model as the first row.
+"""
+
+import argparse
+import json
+import math
+import os
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.keras import layers
+from tensorflow.keras.callbacks import EarlyStopping
+
+import inference
+from benchmarks.backend_parity import latency_ms
+from benchmarks.distillation import count_flops, model_size_mb
+from chest_xray_modified import build_pipelines, load_datasets, make_augmentation
+from model_layers import GrayscaleToResNetInput
+
+# ResNet50 stages: (name, bottleneck width, blocks, first block stride)
+RESNET50_STAGES = (("conv2", 64, 3, 1), ("conv3", 128, 4, 2), ("conv4", 256, 6, 2), ("conv5", 512, 3, 2))
+BN_EPSILON = 1.001e-5  # keras.applications ResNet50
+CHANNEL_MULTIPLE = 8
+
+def block_names():
+    return [f"{stage}_block{i}" for stage, _, blocks, _ in RESNET50_STAGES for i in range(1, blocks + 1)]
+
+def find_base(model):
+    """(index, nested ResNet50) of a model from chest_xray_modified.build_model"""
+    for index, layer in enumerate(model.layers):
+        if isinstance(layer, tf.keras.Model):
+            try:
+                layer.get_layer("conv1_conv")
+            except ValueError:
+                break
+            return index, layer
+    raise ValueError("Expected a model with a nested ResNet50 (prune the trained .keras model, "
+                     "not a grayscale export)")
+
+# ============================================================
+# REBUILD WITH NARROWER BOTTLENECKS
+# ============================================================
+
+def build_resnet50(widths, input_shape):
+    """keras.applications ResNet50 (include_top=False) with per-layer inner widths
+
+    ``widths`` maps ``<block>_1`` and ``<block>_2`` to a filter count; layer
+    names match the original so weights can be copied by name.
+    """
+    def conv_bn(x, filters, kernel_size, name, strides=1, padding="valid", relu=True):
+        x = layers.Conv2D(filters, kernel_size, strides=strides, padding=padding, name=f"{name}_conv")(x)
+        x = layers.BatchNormalization(axis=3, epsilon=BN_EPSILON, name=f"{name}_bn")(x)
+        return layers.Activation("relu", name=f"{name}_relu")(x) if relu else x
+
+    inputs = tf.keras.Input(shape=input_shape)
+    x = layers.ZeroPadding2D(padding=3, name="conv1_pad")(inputs)
+    x = conv_bn(x, 64, 7, "conv1", strides=2)
+    x = layers.ZeroPadding2D(padding=1, name="pool1_pad")(x)
+    x = layers.MaxPooling2D(3, strides=2, name="pool1_pool")(x)
+
+    for stage, filters, blocks, stride in RESNET50_STAGES:
+        for i in range(1, blocks + 1):
+            name = f"{stage}_block{i}"
+            block_stride = stride if i == 1 else 1
+            if i == 1:
+                shortcut = conv_bn(x, 4 * filters, 1, f"{name}_0", strides=block_stride, relu=False)
+            else:
+                shortcut = x
+            y = conv_bn(x, widths[f"{name}_1"], 1, f"{name}_1", strides=block_stride)
+            y = conv_bn(y, widths[f"{name}_2"], 3, f"{name}_2", padding="same")
+            y = conv_bn(y, 4 * filters, 1, f"{name}_3", relu=False)
+            x = layers.Add(name=f"{name}_add")([shortcut, y])
+            x = layers.Activation("relu", name=f"{name}_out")(x)
+    return tf.keras.Model(inputs, x, name="resnet50")
+
+def copy_pruned_weights(source, target, keep):
+    """Copy every weight of source into target, slicing pruned filters and their inputs
+
+    ``keep`` maps ``<block>_1`` / ``<block>_2`` to the kept filter indices.
+    """
+    for layer in target.layers:
+        weights = source.get_layer(layer.name).get_weights()
+        if not weights:
+            continue
+        prefix, _, kind = layer.name.rpartition("_")
+        block, _, position = prefix.rpartition("_")
+        out_index = keep.get(prefix)
+        in_index = keep.get(f"{block}_{int(position) - 1}") if kind == "conv" and position in ("2", "3") else None
+        if kind == "conv":
+            kernel, bias = weights
+            if in_index is not None:
+                kernel = kernel[:, :, in_index, :]
+            if out_index is not None:
+                kernel, bias = kernel[..., out_index], bias[out_index]
+            weights = [kernel, bias]
+        elif out_index is not None:  # BatchNorm: gamma, beta, moving mean, moving variance
+            weights = [w[out_index] for w in weights]
+        layer.set_weights(weights)
+
+def base_input(model, base_index, images):
+    """Grayscale training batch -> the nested ResNet50's input"""
+    if model.inputs[0].shape[-1] == 3:
+        # Original models expect preprocessed 3-channel input
+        return GrayscaleToResNetInput(name="resnet_preprocessing")(images)
+    x = images
+    for layer in model.layers[1:base_index]:
+        x = layer(x)
+    return x
+
+def apply_copy(layer, x):
+    """Call a fresh copy of layer on x, so pruned models never share weights"""
+    clone = layer.__class__.from_config(layer.get_config())
+    y = clone(x)
+    clone.set_weights(layer.get_weights())
+    return y
+
+def prune(model, scores, sparsity):
+    """Rebuilt (N, H, W, 1) grayscale model keeping the best-scored filters of each pruned layer"""
+    base_index, base = find_base(model)
+    keep = {}
+    for name, layer_scores in scores.items():
+        width = len(layer_scores)
+        kept = min(width, max(CHANNEL_MULTIPLE,
+                              math.ceil(width * (1 - sparsity) / CHANNEL_MULTIPLE) * CHANNEL_MULTIPLE))
+        keep[name] = np.sort(np.argsort(layer_scores)[::-1][:kept])
+
+    pruned_base = build_resnet50({name: len(index) for name, index in keep.items()}, base.inputs[0].shape[1:])
+    copy_pruned_weights(base, pruned_base, keep)
+    pruned_base.trainable = True
+
+    model_input = model.inputs[0]
+    inputs = tf.keras.Input(shape=(*model_input.shape[1:3], 1))
+    if model_input.shape[-1] == 3:
+        x = base_input(model, base_index, inputs)
+    else:
+        x = inputs
+        for layer in model.layers[1:base_index]:
+            x = apply_copy(layer, x)
+    x = pruned_base(x, training=False)  # BatchNorm statistics stay frozen, as in training
+    for layer in model.layers[base_index + 1:]:
+        x = apply_copy(layer, x)
+    return tf.keras.Model(inputs, x, name=f"{model.name}_pruned")
+
+# ============================================================
+# FILTER IMPORTANCE
+# ============================================================
+
+def l1_scores(model):
+    """{<block>_1|2: per-filter L1 norm scaled by the BatchNorm that follows}"""
+    _, base = find_base(model)
+    scores = {}
+    for block in block_names():
+        for position in ("1", "2"):
+            name = f"{block}_{position}"
+            kernel = base.get_layer(f"{name}_conv").get_weights()[0]
+            gamma, _, _, variance = base.get_layer(f"{name}_bn").get_weights()
+            scale = np.abs(gamma) / np.sqrt(variance + BN_EPSILON)
+            scores[name] = np.abs(kernel).sum(axis=(0, 1, 2)) * scale
+    return scores
+
+def taylor_scores(model, dataset, batches):
+    """{<block>_1|2: mean |sum over positions of activation x dLoss/dactivation|}"""
+    base_index, base = find_base(model)
+    names = [f"{block}_{position}" for block in block_names() for position in ("1", "2")]
+    probe = tf.keras.Model(base.inputs, [base.get_layer(f"{n}_relu").output for n in names] + [base.output])
+    loss_fn = tf.keras.losses.BinaryCrossentropy()
+    totals = {name: 0.0 for name in names}
+    seen = 0
+    for images, labels in dataset.take(batches):
+        with tf.GradientTape() as tape:
+            *activations, x = probe(base_input(model, base_index, images), training=False)
+            for layer in model.layers[base_index + 1:]:
+                x = layer(x, training=False)
+            loss = loss_fn(tf.reshape(tf.cast(labels, tf.float32), (-1, 1)), x)
+        gradients = tape.gradient(loss, activations)
+        for name, activation, gradient in zip(names, activations, gradients):
+            totals[name] += tf.reduce_sum(tf.abs(tf.reduce_sum(activation * gradient, axis=(1, 2))), axis=0).numpy()
+        seen += int(images.shape[0])
+    return {name: total / seen for name, total in totals.items()}
+
+# ============================================================
+# REPORT
+# ============================================================
+
+def measure(path, test_ds, iterations):
+    """Size, FLOPs, CPU latency and test accuracy of a saved model, served as the app would"""
+    backend = inference.load_model(path, "keras")
+    gray = np.zeros((inference.BATCH_SIZE, inference.IMAGE_SIZE, inference.IMAGE_SIZE, 1), dtype=np.uint8)
+    correct = total = 0
+    for images, labels in test_ds:
+        # Cached test images are whole grey levels, so the uint8 cast is exact
+        probs = backend.predict_batch(images.numpy().astype(np.uint8))
+        correct += int(np.sum((probs > 0.5) == (labels.numpy().reshape(-1) > 0.5)))
+        total += len(probs)
+    return {
+        "params": backend.model.count_params(),
+        "gflops": count_flops(backend.model) / 1e9,
+        "size_mb": model_size_mb(path),
+        "latency_batch1_ms": latency_ms(backend, gray, 1, iterations),
+        f"latency_batch{inference.BATCH_SIZE}_ms": latency_ms(backend, gray, inference.BATCH_SIZE, iterations),
+        "test_accuracy": correct / total,
+    }
+
+def print_table(report):
+    batch_key = f"latency_batch{inference.BATCH_SIZE}_ms"
+    print(f"{'sparsity':>9}{'params':>13}{'GFLOPs':>8}{'MB':>8}{'b1 ms':>9}{batch_key[8:]:>14}{'acc':>8}")
+    for row in report:
+        print(f"{row['sparsity']:>9.2f}{row['params']:>13,}{row['gflops']:>8.2f}{row['size_mb']:>8.1f}"
+              f"{row['latency_batch1_ms']:>9.2f}{row[batch_key]:>14.2f}{row['test_accuracy']:>8.4f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--model", default=inference.MODEL_PATH, help="Trained .keras model")
+    parser.add_argument("--data-root", default="chest_xray", help="Folder with train/val/test class subfolders")
+    parser.add_argument("--shards-dir", help="Pre-decoded shards from convert_dataset.py (instead of --data-root)")
+    parser.add_argument("--sparsities", type=float, nargs="+", default=[0.25, 0.5, 0.75],
+                        help="Fraction of filters removed from each pruned layer")
+    parser.add_argument("--criterion", choices=["l1", "taylor"], default="l1")
+    parser.add_argument("--score-batches", type=int, default=20, help="Training batches for --criterion taylor")
+    parser.add_argument("--fine-tune-epochs", type=int, default=2)
+    parser.add_argument("--learning-rate", type=float, default=1e-4)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--shuffle-buffer", type=int, default=2048)
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--iterations", type=int, default=30, help="Latency samples per model")
+    parser.add_argument("--output-prefix", help="Default: the model path without .keras")
+    parser.add_argument("--report", help="Optional JSON file for the table")
+    parser.add_argument("--verbose", type=int, default=2, choices=[0, 1, 2], help="Keras fit verbosity")
+    args = parser.parse_args()
+    args.image_size = inference.IMAGE_SIZE
+    prefix = args.output_prefix or os.path.splitext(args.model)[0]
+
+    train_ds, val_ds, test_ds, _ = load_datasets(args, 1, 0)
+    train_ds, _, val_ds, test_ds = build_pipelines(args, train_ds, val_ds, test_ds, make_augmentation(), 1, 0)
+
+    model = tf.keras.models.load_model(args.model, compile=False)
+    if args.criterion == "taylor":
+        scores = taylor_scores(model, train_ds, args.score_batches)
+    else:
+        scores = l1_scores(model)
+
+    report = [{"sparsity": 0.0, "path": args.model, **measure(args.model, test_ds, args.iterations)}]
+    for sparsity in args.sparsities:
+        print(f"\nSparsity {sparsity:.2f}: pruning by {args.criterion}, fine-tuning {args.fine_tune_epochs} epoch(s)")
+        pruned = prune(model, scores, sparsity)
+        pruned.compile(
+            optimizer=tf.keras.optimizers.Adam(learning_rate=args.learning_rate),
+            loss="binary_crossentropy",
+            metrics=["accuracy"],
+        )
+        if args.fine_tune_epochs:
+            pruned.fit(
+                train_ds,
+                validation_data=val_ds,
+                epochs=args.fine_tune_epochs,
+                callbacks=[EarlyStopping(monitor="val_loss", patience=1, restore_best_weights=True)],
+                verbose=args.verbose,
+            )
+        path = f"{prefix}_s{round(sparsity * 100):02d}.keras"
+        pruned.save(path)
+        report.append({"sparsity": sparsity, "path": path, **measure(path, test_ds, args.iterations)})
+
+    print()
+    print_table(report)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump({"criterion": args.criterion, "fine_tune_epochs": args.fine_tune_epochs,
+                       "results": report}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""Score every X-ray under a directory tree, resumably
+
+    python score_directory.py /archive/xrays --output scores.csv
+    python score_directory.py /archive/xrays --output scores.parquet --backend onnx \\
+        --model chest_xray_model.onnx
+
+Images are decoded and preprocessed on a thread pool (``inference.decode_image``,
+one thread per core by default) while the model scores the previous batch,
+so decoding and inference overlap. Results go out in file order as they are
+scored: appended to a CSV, or written to a Parquet dataset directory as one
+part file per checkpoint (needs ``pyarrow``). Columns are ``path``
+(relative to the root), ``probability``, ``prediction`` and ``error`` (set
+for images that could not be decoded).
+
+Every ``--checkpoint-every`` images the output is flushed to disk and
+``<output>.progress.json`` records how far the run got. Running the same
+command again resumes from the last checkpoint. Rows written after it are
+dropped and scored again, so every file appears exactly once. The file list
+is snapshotted to ``<output>.files`` on the first run; ``--restart`` rescans
+and starts over.
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import inference
+from backends import BACKENDS
+
+CHECKPOINT_EVERY = 1024
+COLUMNS = ("path", "probability", "prediction", "error")
+
+def list_files(root):
+    """Image paths under root, relative to it, in a stable (sorted) order"""
+    paths = []
+    for directory, subdirs, files in os.walk(root):
+        subdirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(inference.IMAGE_EXTENSIONS):
+                paths.append(os.path.relpath(os.path.join(directory, name), root))
+    return paths
+
+# ============================================================
+# OUTPUT
+# ============================================================
+
+class CsvSink:
+    """Appends rows to a CSV; the checkpoint state is the committed file size"""
+
+    def __init__(self, path, state=None):
+        if state is None:
+            self.file = open(path, "wb")
+            self.write([dict(zip(COLUMNS, COLUMNS))])
+        else:
+            self.file = open(path, "r+b")
+            self.file.truncate(state["bytes"])  # Rows after the last checkpoint are scored again
+            self.file.seek(0, os.SEEK_END)
+
+    def write(self, rows):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, COLUMNS, lineterminator="\n")
+        writer.writerows({k: "" if v is None else v for k, v in row.items()} for row in rows)
+        self.file.write(buffer.getvalue().encode("utf-8"))
+
+    def commit(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        return {"bytes": self.file.tell()}
+
+    def close(self):
+        self.file.close()
+
+class ParquetSink:
+    """Writes a Parquet dataset directory, one part file per checkpoint"""
+
+    def __init__(self, path, state=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)") from e
+        self.pa, self.pq = pa, pq
+        self.path = path
+        self.schema = pa.schema([
+            ("path", pa.string()), ("probability", pa.float64()),
+            ("prediction", pa.string()), ("error", pa.string()),
+        ])
+        self.parts = 0 if state is None else state["parts"]
+        if state is None and os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path, exist_ok=True)
+        for name in os.listdir(path):  # Parts written after the last checkpoint
+            if name.startswith("part-") and int(name[5:10]) >= self.parts:
+                os.remove(os.path.join(path, name))
+        self.rows = []
+
+    def write(self, rows):
+        self.rows.extend(rows)
+
+    def commit(self):
+        if self.rows:
+            table = self.pa.Table.from_pylist(self.rows, schema=self.schema)
+            final = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+            self.pq.write_table(table, final + ".tmp")
+            os.replace(final + ".tmp", final)
+            self.parts += 1
+            self.rows = []
+        return {"parts": self.parts}
+
+    def close(self):
+        pass
+
+def open_sink(path, state=None):
+    sink = ParquetSink if path.endswith(".parquet") else CsvSink
+    return sink(path, state)
+
+# ============================================================
+# PROGRESS
+# ============================================================
+
+def write_json_atomic(path, data):
+    with open(path + ".tmp", "w") as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+def load_run(args):
+    """(paths, progress) for a new run, or for the interrupted one being resumed"""
+    progress_path = args.output + ".progress.json"
+    files_path = args.output + ".files"
+    run = {"root": os.path.abspath(args.root), "model": args.model, "backend": args.backend,
+           "precision": args.precision}
+    if os.path.exists(progress_path) and not args.restart:
+        with open(progress_path) as f:
+            progress = json.load(f)
+        changed = {k: (progress[k], v) for k, v in run.items() if progress[k] != v}
+        if changed:
+            raise SystemExit(f"{args.output} was started with different settings {changed}; "
+                             "pass --restart to score from scratch")
+        with open(files_path) as f:
+            paths = f.read().splitlines()
+        return paths, progress
+
+    paths = list_files(args.root)
+    with open(files_path, "w") as f:
+        f.write("".join(path + "\n" for path in paths))
+    return paths, {**run, "total": len(paths), "completed": 0, "sink": None}
+
+def decoded(root, paths, workers, prefetch):
+    """(path, array, error) in order, decoded up to prefetch images ahead on a thread pool"""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        window = deque()
+        source = iter(paths)
+        while True:
+            while len(window) < prefetch:
+                path = next(source, None)
+                if path is None:
+                    break
+                window.append((path, pool.submit(inference.decode_image, os.path.join(root, path))))
+            if not window:
+                return
+            path, future = window.popleft()
+            yield (path, *future.result())
+
+# ============================================================
+# SCORING
+# ============================================================
+
+def to_rows(model, pending, batch_size):
+    """Score the decodable images of pending and return one row per image, in order"""
+    arrays = [array for _, array, _ in pending if array is not None]
+    probs = iter(inference.predict_in_batches(model, arrays, batch_size) if arrays else [])
+    rows = []
+    for path, array, error in pending:
+        if array is None:
+            rows.append({"path": path, "probability": None, "prediction": None, "error": error})
+        else:
+            prob = next(probs)
+            rows.append({"path": path, "probability": round(prob, 6),
+                         "prediction": inference.CLASS_NAMES[int(prob > 0.5)], "error": None})
+    return rows
+
+def score(model, args, paths, progress):
+    """Score paths[progress["completed"]:], checkpointing as it goes; returns images scored"""
+    progress_path = args.output + ".progress.json"
+    start_index = progress["completed"]
+    sink = open_sink(args.output, progress["sink"])
+    start = last_time = time.perf_counter()
+    last_completed = start_index
+    pending = []
+
+    def checkpoint():
+        nonlocal last_time, last_completed
+        progress["sink"] = sink.commit()
+        write_json_atomic(progress_path, progress)
+        now = time.perf_counter()
+        done = progress["completed"]
+        rate = (done - start_index) / (now - start)
+        recent = (done - last_completed) / (now - last_time) if now > last_time else 0.0
+        eta = (progress["total"] - done) / rate if rate else 0.0
+        print(f"{done:>8}/{progress['total']} images  {rate:7.1f} img/s  "
+              f"(last {done - last_completed}: {recent:.1f} img/s)  ETA {eta / 60:.1f} min", flush=True)
+        last_time, last_completed = now, done
+
+    try:
+        for item in decoded(args.root, paths[start_index:], args.workers, args.batch_size * 4):
+            pending.append(item)
+            if sum(1 for _, array, _ in pending if array is not None) < args.batch_size:
+                continue
+            sink.write(to_rows(model, pending, args.batch_size))
+            progress["completed"] += len(pending)
+            pending = []
+            if progress["completed"] - last_completed >= args.checkpoint_every:
+                checkpoint()
+        if pending:
+            sink.write(to_rows(model, pending, args.batch_size))
+            progress["completed"] += len(pending)
+        checkpoint()
+    except KeyboardInterrupt:
+        # No checkpoint here: the interrupt can land between a write and its count.
+        # Resuming truncates to the last checkpoint, where the two always agree
+        print(f"Interrupted; run the same command again to resume from image {last_completed}")
+        raise SystemExit(130)
+    finally:
+        sink.close()
+    return progress["completed"] - start_index
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a directory tree of chest X-rays")
+    parser.add_argument("root", help="Directory searched recursively for .jpg/.jpeg/.png")
+    parser.add_argument("--output", required=True, help="CSV file, or a .parquet dataset directory")
+    parser.add_argument("--model", default=inference.MODEL_PATH, help="Path to the model file")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="keras",
+                        help="Runtime used to run --model")
+    parser.add_argument("--precision", choices=["float32", "bfloat16"], default="float32")
+    parser.add_argument("--batch-size", type=int, default=inference.BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Decode threads")
+    parser.add_argument("--checkpoint-every", type=int, default=CHECKPOINT_EVERY,
+                        help="Images between progress checkpoints")
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress and start over")
+    args = parser.parse_args()
+
+    paths, progress = load_run(args)
+    if progress["completed"] >= progress["total"]:
+        print(f"All {progress['total']} images already scored in {args.output}")
+        return
+    if progress["completed"]:
+        print(f"Resuming at image {progress['completed']} of {progress['total']}")
+    else:
+        print(f"Scoring {progress['total']} images under {args.root}")
+
+    model = inference.load_model(args.model, args.backend, args.precision)
+    start = time.perf_counter()
+    scored = score(model, args, paths, progress)
+    elapsed = time.perf_counter() - start
+    print(f"Scored {scored} images in {elapsed:.1f}s ({scored / elapsed:.1f} img/s) -> {args.output}")
+
+if __name__ == "__main__":
+    main()
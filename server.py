@@ -0,0 +1,221 @@
+"""Headless HTTP inference server for PneumoDetect
+
+Run with:  python server.py --port 8000
+
+Endpoints:
+    GET  /health   -> {"status": "ok"}
+    GET  /stats    -> prediction cache hit/miss counters
+    GET  /metrics  -> Prometheus text format: request and per-stage latency
+                      histograms, request/error/cache counters, model load time
+    POST /predict  -> single image as the raw request body (image/* or
+                      application/octet-stream), or a multipart/form-data
+                      batch with one file part per image
+
+The response is {"predictions": [{"filename", "label", "probability",
+"confidence", "error"}, ...]} in request order.
+"""
+
+import argparse
+import json
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import inference
+import metrics
+from backends import BACKENDS
+from batcher import MAX_BATCH_SIZE, MAX_WAIT_MS, DynamicBatcher
+from prediction_cache import CACHE_PATH, PredictionCache, model_version
+
+MAX_BODY_BYTES = 512 * 1024 * 1024
+
+# ============================================================
+# REQUEST PARSING
+# ============================================================
+
+def parse_multipart(content_type, body):
+    """Split a multipart/form-data body into (filename, bytes) pairs"""
+    message = BytesParser(policy=HTTP).parsebytes(
+        b"Content-Type: " + content_type.encode("latin-1") + b"\r\n\r\n" + body
+    )
+    if not message.is_multipart():
+        raise ValueError("Malformed multipart body")
+    files = []
+    for index, part in enumerate(message.iter_parts()):
+        filename = part.get_filename() or part.get_param("name", header="content-disposition")
+        files.append((filename or f"file{index}", part.get_payload(decode=True) or b""))
+    return files
+
+def format_prediction(filename, prob, error):
+    """JSON-ready result for one image"""
+    if error is not None:
+        return {"filename": filename, "label": None, "probability": None,
+                "confidence": None, "error": error}
+    return {
+        "filename": filename,
+        "label": "PNEUMONIA" if prob > 0.5 else "NORMAL",
+        "probability": prob,
+        "confidence": prob if prob > 0.5 else 1 - prob,
+        "error": None,
+    }
+
+# ============================================================
+# HTTP HANDLER
+# ============================================================
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    """Routes /health, /stats, /metrics and /predict; the model lives on the server instance"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif self.path == "/stats":
+            self.send_json(200, {"cache": self.server.cache.stats() if self.server.cache else None})
+        elif self.path == "/metrics":
+            self.send_bytes(200, metrics.CONTENT_TYPE, metrics.render().encode("utf-8"))
+        else:
+            self.send_json(404, {"error": "Not found"})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self.send_json(404, {"error": "Not found"})
+            return
+
+        metrics.REQUESTS.labels(endpoint="predict").inc()
+        start = time.perf_counter()
+        try:
+            self.handle_predict()
+        except Exception:
+            metrics.ERRORS.labels(endpoint="predict", kind="internal").inc()
+            raise
+        finally:
+            metrics.REQUEST_SECONDS.labels(endpoint="predict").observe(time.perf_counter() - start)
+
+    def handle_predict(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length <= 0:
+            self.send_error_json(400, "Empty request body")
+            return
+        if length > MAX_BODY_BYTES:
+            self.send_error_json(413, "Request body too large")
+            return
+        body = self.rfile.read(length)
+
+        content_type = self.headers.get("Content-Type", "application/octet-stream")
+        try:
+            if content_type.startswith("multipart/form-data"):
+                files = parse_multipart(content_type, body)
+            else:
+                files = [(self.headers.get("X-Filename", "image"), body)]
+        except ValueError as e:
+            self.send_error_json(400, str(e))
+            return
+
+        try:
+            results = self.server.predict([data for _, data in files])
+        except Exception as e:
+            # Raised by the model through the batcher's future; answer instead of dropping the connection
+            metrics.ERRORS.labels(endpoint="predict", kind="model").inc()
+            self.log_error("Prediction failed: %r", e)
+            self.send_json(500, {"error": f"Prediction failed: {e}"})
+            return
+        self.send_json(200, {"predictions": [
+            format_prediction(filename, prob, error)
+            for (filename, _), (prob, error) in zip(files, results)
+        ]})
+
+    def send_error_json(self, status, message):
+        metrics.ERRORS.labels(endpoint="predict", kind="bad_request").inc()
+        self.send_json(status, {"error": message})
+
+    def send_json(self, status, payload):
+        self.send_bytes(status, "application/json", json.dumps(payload).encode("utf-8"))
+
+    def send_bytes(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+class InferenceServer(ThreadingHTTPServer):
+    """Threaded HTTP server; all request threads share one dynamic batcher"""
+
+    daemon_threads = True
+
+    def __init__(self, address, model, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS,
+                 cache=None):
+        super().__init__(address, InferenceHandler)
+        self.cache = cache
+        self.batcher = DynamicBatcher(
+            lambda batch: inference.predict_batch(model, batch), max_batch_size, max_wait_ms
+        )
+
+    def predict(self, sources):
+        """Score raw image bytes; returns one (probability, error) pair per image"""
+        results = [(None, None)] * len(sources)
+        pending = []
+        for i, content in enumerate(sources):
+            prob = self.cache.get(content) if self.cache is not None else None
+            if prob is not None:
+                results[i] = (prob, None)
+            else:
+                pending.append(i)
+
+        decoded = inference.decode_images([sources[i] for i in pending])
+        futures = [self.batcher.submit(array) if array is not None else None for array, _ in decoded]
+        for i, future, (_, error) in zip(pending, futures, decoded):
+            if future is None:
+                metrics.ERRORS.labels(endpoint="predict", kind="decode").inc()
+                results[i] = (None, error)
+                continue
+            prob = future.result()
+            if self.cache is not None:
+                self.cache.put(sources[i], prob)
+            results[i] = (prob, None)
+        return results
+
+    def server_close(self):
+        super().server_close()
+        self.batcher.close()
+
+# ============================================================
+# ENTRY POINT
+# ============================================================
+
+def main():
+    parser = argparse.ArgumentParser(description="PneumoDetect inference server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--model", default=inference.MODEL_PATH, help="Path to the model file")
+    parser.add_argument("--backend", choices=sorted(BACKENDS), default="keras",
+                        help="Runtime used to serve --model")
+    parser.add_argument("--precision", choices=["float32", "bfloat16"], default="float32",
+                        help="Compute precision (bfloat16 needs the keras backend)")
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE,
+                        help="Largest batch the dynamic batcher will form")
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS,
+                        help="How long the batcher waits for more requests after the first")
+    parser.add_argument("--cache-path", default=CACHE_PATH,
+                        help="SQLite prediction cache file (empty string keeps the cache in memory only)")
+    args = parser.parse_args()
+
+    version = model_version(args.model)  # Of the file about to be loaded, for the cache keys
+    model = inference.load_model(args.model, args.backend, args.precision)
+    cache = PredictionCache(args.model, args.cache_path, backend=args.backend, precision=args.precision,
+                            version=version)
+    server = InferenceServer((args.host, args.port), model, args.max_batch_size, args.max_wait_ms,
+                             cache)
+    print(f"PneumoDetect inference server listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""tf.data reader for shards written by convert_dataset.py
+
+Records are read straight out of the .npy files with FixedLengthRecordDataset
+(no Python in the loop), interleaving several shards in parallel. Yields
+batched ``(uint8 (N, 224, 224, 1), int32 (N,))`` like
+``image_dataset_from_directory(color_mode='grayscale')`` but without
+re-decoding any JPEGs.
+"""
+
+import json
+import os
+
+import tensorflow as tf
+
+def load_manifest(shard_dir):
+    with open(os.path.join(shard_dir, "manifest.json")) as f:
+        return json.load(f)
+
+def _header_bytes(shards, kind):
+    sizes = {shard["header_bytes"][kind] for shard in shards}
+    if len(sizes) != 1:
+        raise ValueError(f"Shards have mixed .npy {kind} header sizes: {sorted(sizes)}")
+    return sizes.pop()
+
+def make_dataset(shard_dir, split, batch_size=32, shuffle=False, seed=None,
+                 cycle_length=8, shuffle_buffer=2048, num_shards=1, shard_index=0):
+    """Batched (images, labels) dataset for one split
+
+    With ``num_shards > 1`` (data-parallel workers) this returns only worker
+    ``shard_index``'s part: whole shard files when there are enough of
+    them, otherwise every num_shards-th record.
+    """
+    manifest = load_manifest(shard_dir)
+    shards = manifest["splits"][split]["shards"]
+    size = manifest["image_size"]
+    channels = manifest["channels"]
+    image_bytes = size * size * channels
+    image_header = _header_bytes(shards, "images")
+    label_header = _header_bytes(shards, "labels")
+
+    files = tf.data.Dataset.from_tensor_slices((
+        [os.path.join(shard_dir, shard["images"]) for shard in shards],
+        [os.path.join(shard_dir, shard["labels"]) for shard in shards],
+    ))
+    split_files = num_shards > 1 and len(shards) >= num_shards
+    if split_files:
+        files = files.shard(num_shards, shard_index)
+    if shuffle:
+        files = files.shuffle(len(shards), seed=seed, reshuffle_each_iteration=True)
+
+    def read_shard(image_path, label_path):
+        images = tf.data.FixedLengthRecordDataset(image_path, image_bytes, header_bytes=image_header)
+        labels = tf.data.FixedLengthRecordDataset(label_path, 1, header_bytes=label_header)
+        records = tf.data.Dataset.zip((images, labels))
+        if num_shards > 1 and not split_files:
+            records = records.shard(num_shards, shard_index)
+        return records
+
+    def decode(image_record, label_record):
+        image = tf.reshape(tf.io.decode_raw(image_record, tf.uint8), (size, size, channels))
+        label = tf.cast(tf.io.decode_raw(label_record, tf.uint8)[0], tf.int32)
+        return image, label
+
+    ds = files.interleave(
+        read_shard,
+        cycle_length=min(cycle_length, len(shards)),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not shuffle,
+    )
+    ds = ds.map(decode, num_parallel_calls=tf.data.AUTOTUNE)
+    if shuffle:
+        ds = ds.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    return ds.batch(batch_size)
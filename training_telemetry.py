@@ -0,0 +1,124 @@
+"""Per-epoch JSON-lines training telemetry
+
+``EpochTelemetry`` is a Keras callback that writes one JSON object per epoch:
+step time, images/sec, time the training loop spent waiting on the input
+pipeline, peak memory and the epoch's metrics. ``InputTimer`` measures that
+wait by handing batches to Keras through a thin generator that times each
+``next()`` on the real pipeline, so it only counts time the loop was
+actually blocked (batches already in the prefetch buffer cost ~0). That
+generator puts Python back in the input path, so the timer is opt-in
+(``--time-input``); without it ``input_wait_s`` is null.
+"""
+
+import json
+import resource
+import sys
+import time
+
+import numpy as np
+import tensorflow as tf
+
+def peak_memory_mb():
+    """Process resident-set high-water mark, plus the GPU allocator peak when there is one"""
+    memory = {"max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    if tf.config.list_physical_devices("GPU"):
+        memory["gpu_peak_mb"] = tf.config.experimental.get_memory_info("GPU:0")["peak"] / 2**20
+    return memory
+
+def write_record(path, record):
+    """Append one JSON line to path ("-" for stdout)"""
+    line = json.dumps(record)
+    if path == "-":
+        print(line, file=sys.stdout, flush=True)
+    else:
+        with open(path, "a") as f:
+            f.write(line + "\n")
+
+class InputTimer:
+    """Wraps a batched dataset and accumulates time spent blocked on next()
+
+    Use ``timer.dataset`` in place of the original. Nothing is prefetched
+    after the timing point, otherwise the prefetch thread would absorb the
+    wait instead of the training loop.
+    """
+
+    def __init__(self, dataset):
+        self._source = dataset
+        self.dataset = tf.data.Dataset.from_generator(
+            self._timed, output_signature=dataset.element_spec
+        ).with_options(dataset.options())
+        self.reset()
+
+    def _timed(self):
+        iterator = iter(self._source)
+        while True:
+            start = time.perf_counter()
+            try:
+                images, labels = next(iterator)
+            except StopIteration:
+                return
+            self.wait_s += time.perf_counter() - start
+            self.images += int(images.shape[0])
+            yield images, labels
+
+    def reset(self):
+        """Return (wait_s, images) since the last reset and start over"""
+        totals = (getattr(self, "wait_s", 0.0), getattr(self, "images", 0))
+        self.wait_s = 0.0
+        self.images = 0
+        return totals
+
+class EpochTelemetry(tf.keras.callbacks.Callback):
+    """Write one JSON line per epoch to ``path`` ("-" for stdout)
+
+    ``batch_size`` is used for images/sec when no ``input_timer`` counts the
+    images (e.g. training on in-memory arrays). ``extra`` fields such as the
+    run id or worker index are copied into every record.
+    """
+
+    def __init__(self, path, phase, batch_size, input_timer=None, extra=None):
+        super().__init__()
+        self.path = path
+        self.phase = phase
+        self.batch_size = batch_size
+        self.input_timer = input_timer
+        self.extra = extra or {}
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._step_times = []
+        if self.input_timer is not None:
+            self.input_timer.reset()
+        self._epoch_start = time.perf_counter()
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self._step_start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        self._step_times.append(time.perf_counter() - self._step_start)
+
+    def on_epoch_end(self, epoch, logs=None):
+        epoch_s = time.perf_counter() - self._epoch_start
+        steps = np.array(self._step_times) * 1000
+        train_s = float(steps.sum()) / 1000
+        if self.input_timer is not None:
+            wait_s, images = self.input_timer.reset()
+        else:
+            wait_s, images = None, len(steps) * self.batch_size
+        record = {
+            "phase": self.phase,
+            "epoch": epoch + 1,
+            "steps": len(steps),
+            "epoch_s": epoch_s,
+            "step_time_ms": float(steps.mean()) if len(steps) else None,
+            "step_time_p50_ms": float(np.median(steps)) if len(steps) else None,
+            "step_time_p95_ms": float(np.percentile(steps, 95)) if len(steps) else None,
+            "images": images,
+            "images_per_sec": images / train_s if train_s else None,
+            "input_wait_s": wait_s,
+            "input_wait_fraction": wait_s / train_s if wait_s is not None and train_s else None,
+            "learning_rate": float(tf.keras.backend.get_value(self.model.optimizer.learning_rate)),
+            **peak_memory_mb(),
+            **{k: float(v) for k, v in (logs or {}).items() if k != "learning_rate"},
+            **self.extra,
+        }
+        write_record(self.path, record)